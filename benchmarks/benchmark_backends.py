@@ -0,0 +1,171 @@
+"""
+benchmark_backends.py
+author: slapelachie <slapelachie@gmail.com>
+
+Compares the throughput and peak memory of the image backends.
+
+Usage:
+    python benchmarks/benchmark_backends.py [--archive book.cbz] [--pages 8]
+        [--max-dimension 1680]
+"""
+import argparse
+import io
+import multiprocessing
+import resource
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from einkify.api import resolve_profile
+from einkify.archive_extractor import read_archive_images
+from einkify.image_backend import get_max_size
+from einkify.image_processor import convert_image_data, get_backend
+
+BACKENDS = ["pillow", "vips"]
+# An A4 page scanned at 600dpi
+PAGE_SIZE = (4960, 7016)
+# The longer side of a 7" e-reader screen, so pages are shrunk as they would be
+# in practice (the default profile leaves them at full size)
+MAX_DIMENSION = 1680
+
+
+def make_page(size: Tuple[int, int] = PAGE_SIZE) -> bytes:
+    """
+    Makes a grainy gradient page, which compresses like a scan.
+
+    Args:
+        size (Tuple[int, int], optional): The page dimensions. Defaults to an
+            A4 page at 600dpi.
+
+    Returns:
+        bytes: The page, encoded as a JPEG.
+    """
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 32)
+    page = Image.merge("RGB", [gradient, noise, gradient])
+
+    stream = io.BytesIO()
+    page.save(stream, format="JPEG", quality=90)
+    return stream.getvalue()
+
+
+def load_pages(archive_path: Optional[str], page_count: int) -> List[bytes]:
+    """
+    Loads the pages to convert.
+
+    Args:
+        archive_path (str, optional): A comic book archive to take pages from,
+            or None to generate pages.
+        page_count (int): The number of pages.
+
+    Returns:
+        List[bytes]: The encoded pages.
+    """
+    if archive_path is None:
+        page = make_page()
+        return [page] * page_count
+
+    with open(archive_path, "rb") as stream:
+        images = read_archive_images(stream.read())
+        return [bytes(data) for _, data in images][:page_count]
+
+
+def run_backend(backend: str, profile: Dict, pages: List[bytes]) -> Dict:
+    """
+    Converts the pages with a backend, in the current process.
+
+    Args:
+        backend (str): The name of the backend.
+        profile (dict): The conversion profile.
+        pages (List[bytes]): The encoded pages.
+
+    Returns:
+        dict: The elapsed seconds and the peak resident memory in megabytes.
+    """
+    profile = {**profile, "backend": backend}
+    get_backend(backend)
+
+    start = time.perf_counter()
+    for page in pages:
+        convert_image_data(profile, page)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"seconds": elapsed, "peak_memory": peak_memory}
+
+
+def benchmark(backend: str, profile: Dict, pages: List[bytes]) -> Dict:
+    """
+    Converts the pages with a backend in a fresh process, so each backend's
+    peak memory is measured on its own.
+
+    Args:
+        backend (str): The name of the backend.
+        profile (dict): The conversion profile.
+        pages (List[bytes]): The encoded pages.
+
+    Returns:
+        dict: The elapsed seconds and the peak resident memory in megabytes.
+    """
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_backend, (backend, profile, pages))
+
+
+def main() -> None:
+    """
+    Runs the benchmark and prints a table of the results.
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(
+        description="Compares the throughput and peak memory of the image "
+        "backends."
+    )
+    parser.add_argument(
+        "--archive", type=str, help="Archive to take pages from"
+    )
+    parser.add_argument(
+        "--pages", type=int, default=8, help="Pages to convert"
+    )
+    parser.add_argument("--profile", type=str, help="Profile to use")
+    parser.add_argument(
+        "--max-dimension",
+        type=int,
+        default=MAX_DIMENSION,
+        help="Maximum page width and height before zooming, overriding the "
+        f"profile (default: {MAX_DIMENSION})",
+    )
+    arguments = parser.parse_args()
+
+    profile = {
+        **resolve_profile(arguments.profile),
+        "max_dimension": arguments.max_dimension,
+    }
+    pages = load_pages(arguments.archive, arguments.pages)
+    page_megabytes = sum(len(page) for page in pages) / 1024 / 1024
+    print(
+        f"{len(pages)} pages, {page_megabytes:.1f} MB encoded, shrunk to fit "
+        f"{get_max_size(profile)[0]}px"
+    )
+    print(f"{'backend':<10}{'pages/s':>10}{'peak MB':>10}")
+
+    for backend in BACKENDS:
+        try:
+            result = benchmark(backend, profile, pages)
+        except ImportError as error:
+            print(f"{backend:<10}{'skipped':>10}  ({error})")
+            continue
+
+        pages_per_second = len(pages) / result["seconds"]
+        print(
+            f"{backend:<10}{pages_per_second:>10.2f}"
+            f"{result['peak_memory']:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
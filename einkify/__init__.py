@@ -0,0 +1,7 @@
+"""
+einkify
+author: slapelachie <slapelachie@gmail.com>
+"""
+from .api import convert, convert_async
+
+__all__ = ["convert", "convert_async"]
@@ -2,15 +2,381 @@
 main.py
 author: slapelachie <slapelachie@gmail.com>
 """
+import argparse
+import functools
 import os
-import tempfile
+import sys
+import time
+import zipfile
+from typing import Dict, List, Optional
 
 
 from .cli import parse_arguments
-from .archive_extractor import extract_file
+from .archive_extractor import MappedZipArchive, extract_file
 from .profile_processor import get_profile
-from .image_processor import process_images
-from .ebook_generator import make_ebook, get_title
+from .image_processor import convert_pages, get_image_paths, read_images
+from .ebook_generator import make_ebooks, get_title
+from .constants import MEGABYTE
+from .journal import (
+    WorkDirectory,
+    clean_work_directories,
+    get_book_key,
+    get_work_key,
+)
+from .scratch import (
+    check_free_space,
+    exit_on_signals,
+    get_required_space,
+    get_state_directory,
+    scratch_directory,
+)
+from .spool import DONE_DIRECTORY, FAILED_DIRECTORY, HOST_OPTIONS, Spool
+
+# Seconds an idle worker waits before looking at the spool again
+POLL_INTERVAL = 5
+
+
+def get_output_file(
+    output_file: Optional[str], input_file: str, batch: bool
+) -> Optional[str]:
+    """
+    Gets the path to write the epub of an input file to.
+
+    Args:
+        output_file (str, optional): The output given on the command line.
+        input_file (str): The path to the comic book archive.
+        batch (bool): Whether several files are being converted, in which case
+            the output is a directory.
+
+    Returns:
+        str: The path to the epub, or None to use the default.
+    """
+    if output_file and (batch or os.path.isdir(output_file)):
+        os.makedirs(output_file, exist_ok=True)
+        return os.path.join(output_file, f"{get_title(input_file)}.kepub.epub")
+
+    return output_file
+
+
+def get_output_files(
+    output_file: Optional[str], input_files: List[str]
+) -> List[Optional[str]]:
+    """
+    Gets the paths to write the epubs of the input files to.
+
+    Args:
+        output_file (str, optional): The output given on the command line.
+        input_files (List[str]): The paths to the comic book archives.
+
+    Returns:
+        List[str]: The path to each epub, or None to use the default.
+
+    Raises:
+        ValueError: If two input files would be written to the same epub, such
+            as archives with the same name in different directories.
+    """
+    batch = len(input_files) > 1
+    output_files = [
+        get_output_file(output_file, input_file, batch)
+        for input_file in input_files
+    ]
+
+    input_files_by_output: Dict[str, str] = {}
+    for input_file, input_output_file in zip(input_files, output_files):
+        epub_file_path = os.path.abspath(
+            input_output_file or f"{get_title(input_file)}.kepub.epub"
+        )
+        if epub_file_path in input_files_by_output:
+            raise ValueError(
+                f"{input_files_by_output[epub_file_path]} and {input_file} "
+                f"would both be written to {epub_file_path}"
+            )
+        input_files_by_output[epub_file_path] = input_file
+
+    return output_files
+
+
+def convert_book(
+    input_file: str,
+    output_file: Optional[str],
+    profile: Dict,
+    temp_directory: str,
+    work_directory: Optional[WorkDirectory] = None,
+) -> List[str]:
+    """
+    Converts a comic book archive to one or more epubs.
+
+    The pages of cbz archives are read straight from the memory mapped archive;
+    other archives are extracted to the temporary directory first.
+
+    Args:
+        input_file (str): The path to the comic book archive.
+        output_file (str, optional): The path to write the epub to.
+        profile (dict): The conversion profile.
+        temp_directory (str): The directory to keep intermediate files in.
+        work_directory (WorkDirectory, optional): The work directory to journal
+            progress in, resuming any work it already records.
+
+    Returns:
+        List[str]: The paths to the generated epubs.
+    """
+    title = get_title(input_file)
+
+    if zipfile.is_zipfile(input_file):
+        processed_images_directory = os.path.join(temp_directory, "convert")
+        with MappedZipArchive(input_file) as archive:
+            duplicates = convert_pages(
+                profile,
+                archive.image_paths,
+                archive.read_images,
+                processed_images_directory,
+                work_directory,
+            )
+    else:
+        if work_directory is not None and work_directory.journal.events(
+            "extracted"
+        ):
+            extract_directory = os.path.join(temp_directory, title)
+        else:
+            extract_directory = extract_file(input_file, temp_directory)
+            if work_directory is not None:
+                work_directory.journal.record("extracted")
+
+        processed_images_directory = os.path.join(temp_directory, "convert")
+        duplicates = convert_pages(
+            profile,
+            get_image_paths(extract_directory),
+            functools.partial(read_images, extract_directory),
+            processed_images_directory,
+            work_directory,
+        )
+
+    return make_ebooks(
+        title,
+        processed_images_directory,
+        output_file,
+        max_bytes=(profile["split_size"] or 0) * MEGABYTE,
+        max_pages=profile["split_pages"],
+        by_chapter=profile["split_chapters"],
+        duplicates=duplicates,
+        temp_root=temp_directory,
+    )
+
+
+def convert_book_resumable(
+    input_file: str,
+    output_file: Optional[str],
+    profile: Dict,
+    batch_directory: WorkDirectory,
+) -> List[str]:
+    """
+    Converts a comic book archive, journaling progress so that an interrupted
+    conversion picks up from the last converted page when run again.
+
+    Books the batch journal records as done, whose epubs still exist, are
+    skipped. The book's work directory is deleted once its epubs are written,
+    and kept for resuming if the conversion fails.
+
+    Args:
+        input_file (str): The path to the comic book archive.
+        output_file (str, optional): The path to write the epub to.
+        profile (dict): The conversion profile.
+        batch_directory (WorkDirectory): The work directory of the batch.
+
+    Returns:
+        List[str]: The paths to the generated epubs.
+    """
+    book_key = get_book_key(input_file, profile)
+    for entry in batch_directory.journal.events("book"):
+        if entry["key"] == book_key and all(
+            os.path.exists(epub_file_path)
+            for epub_file_path in entry["outputs"]
+        ):
+            return entry["outputs"]
+
+    state_directory = get_state_directory(profile["workdir"])
+    work_directory = WorkDirectory(state_directory, book_key)
+    try:
+        check_free_space(state_directory, get_required_space(input_file))
+        epub_file_paths = convert_book(
+            input_file,
+            output_file,
+            profile,
+            work_directory.path,
+            work_directory,
+        )
+    except BaseException:
+        work_directory.release()
+        raise
+
+    batch_directory.journal.record(
+        "book", key=book_key, outputs=epub_file_paths
+    )
+    work_directory.cleanup()
+
+    return epub_file_paths
+
+
+def convert_books(
+    arguments: argparse.Namespace,
+    profile: Dict,
+    output_files: List[Optional[str]],
+) -> None:
+    """
+    Converts the comic book archives given on the command line.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command-line arguments.
+        profile (dict): The conversion profile.
+        output_files (List[str]): The path to write each epub to, see
+            get_output_files().
+
+    Returns:
+        None
+    """
+    batch = len(arguments.input_files) > 1
+    batch_directory = None
+    if arguments.resume:
+        batch_directory = WorkDirectory(
+            get_state_directory(profile["workdir"]),
+            get_work_key(
+                "batch",
+                *[os.path.abspath(path) for path in arguments.input_files],
+                str(arguments.output_file),
+            ),
+        )
+
+    failed = False
+    for input_file, output_file in zip(arguments.input_files, output_files):
+        try:
+            if batch_directory is not None:
+                epub_file_paths = convert_book_resumable(
+                    input_file, output_file, profile, batch_directory
+                )
+            else:
+                with scratch_directory(
+                    input_file, profile["workdir"], profile["memory_budget"]
+                ) as temp_directory:
+                    epub_file_paths = convert_book(
+                        input_file, output_file, profile, temp_directory
+                    )
+        except Exception as error:  # pylint: disable=broad-except
+            if not batch:
+                raise
+            print(f"Failed to convert {input_file}: {error}", file=sys.stderr)
+            failed = True
+            continue
+
+        for epub_file_path in epub_file_paths:
+            print(f"Generated epub to {epub_file_path}")
+
+    if batch_directory is not None:
+        if failed:
+            batch_directory.release()
+        else:
+            batch_directory.cleanup()
+
+    if failed:
+        sys.exit(1)
+
+
+def enqueue_books(
+    arguments: argparse.Namespace,
+    profile: Dict,
+    output_files: List[Optional[str]],
+) -> None:
+    """
+    Queues the comic book archives given on the command line in the spool, for
+    workers to convert.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command-line arguments.
+        profile (dict): The conversion profile the workers use.
+        output_files (List[str]): The path to write each epub to, see
+            get_output_files().
+
+    Returns:
+        None
+    """
+    spool = Spool(arguments.spool, lease_ttl=arguments.lease_ttl)
+    for input_file, output_file in zip(arguments.input_files, output_files):
+        output_file = output_file or f"{get_title(input_file)}.kepub.epub"
+        if spool.enqueue(input_file, output_file, profile) is None:
+            print(f"Already queued or converted {input_file}")
+        else:
+            print(f"Queued {input_file}")
+
+
+def run_worker(
+    spool: Spool,
+    profile: Dict,
+    exit_when_empty: bool = False,
+    poll_interval: float = POLL_INTERVAL,
+) -> None:
+    """
+    Converts books from the spool until stopped.
+
+    Each book is converted with the profile it was queued with, except for the
+    options each host chooses for itself (see HOST_OPTIONS), which come from
+    this worker's profile.
+
+    Args:
+        spool (Spool): The spool to take books from.
+        profile (dict): The worker's conversion profile.
+        exit_when_empty (bool, optional): Whether to return once no books are
+            queued, rather than waiting for more. Defaults to False.
+        poll_interval (float, optional): The seconds to wait between looking
+            for books. Defaults to POLL_INTERVAL.
+
+    Returns:
+        None
+    """
+    while True:
+        claimed = spool.claim()
+        if claimed is None:
+            # Books leased by other workers may still have to be taken over
+            if exit_when_empty and not spool.get_job_ids():
+                return
+            time.sleep(poll_interval)
+            continue
+
+        job, lease = claimed
+        job_profile = {
+            **job["profile"],
+            **{option: profile[option] for option in HOST_OPTIONS},
+        }
+        with lease:
+            try:
+                with scratch_directory(
+                    job["input_file"],
+                    job_profile["workdir"],
+                    job_profile["memory_budget"],
+                ) as temp_directory:
+                    epub_file_paths = convert_book(
+                        job["input_file"],
+                        job["output_file"],
+                        job_profile,
+                        temp_directory,
+                    )
+            except Exception as error:  # pylint: disable=broad-except
+                print(
+                    f"Failed to convert {job['input_file']}: {error}",
+                    file=sys.stderr,
+                )
+                spool.finish(job, lease, FAILED_DIRECTORY, error=str(error))
+                continue
+
+            if not spool.finish(
+                job, lease, DONE_DIRECTORY, outputs=epub_file_paths
+            ):
+                print(
+                    f"Lost the lease of {job['input_file']} to another worker",
+                    file=sys.stderr,
+                )
+                continue
+
+        for epub_file_path in epub_file_paths:
+            print(f"Generated epub to {epub_file_path}")
 
 
 def main() -> None:
@@ -22,17 +388,45 @@ def main() -> None:
     """
     arguments = parse_arguments()
 
-    temp_directory = tempfile.TemporaryDirectory()
-    title = get_title(arguments.input_file)
-    extract_directory = extract_file(arguments.input_file, temp_directory.name)
-
     profile = get_profile(arguments.profile)
-    processed_images_directory = process_images(profile, extract_directory)
+    for option in [
+        "split_size",
+        "split_pages",
+        "split_chapters",
+        "workdir",
+        "memory_budget",
+    ]:
+        if getattr(arguments, option) is not None:
+            profile[option] = getattr(arguments, option)
 
-    epub_file_path = make_ebook(
-        title, processed_images_directory, arguments.output_file
-    )
-    print(f"Generated epub to {epub_file_path}")
+    if arguments.clean:
+        for path in clean_work_directories(
+            get_state_directory(profile["workdir"])
+        ):
+            print(f"Removed {path}")
+        return
+
+    if not arguments.worker:
+        try:
+            output_files = get_output_files(
+                arguments.output_file, arguments.input_files
+            )
+        except ValueError as error:
+            sys.exit(f"einkify: error: {error}")
+
+    if arguments.spool and not arguments.worker:
+        enqueue_books(arguments, profile, output_files)
+        return
+
+    with exit_on_signals():
+        if arguments.worker:
+            run_worker(
+                Spool(arguments.spool, lease_ttl=arguments.lease_ttl),
+                profile,
+                arguments.exit_when_empty,
+            )
+        else:
+            convert_books(arguments, profile, output_files)
 
 
 if __name__ == "__main__":
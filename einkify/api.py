@@ -0,0 +1,158 @@
+"""
+api.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+import asyncio
+import functools
+import io
+from concurrent.futures import Executor
+from typing import BinaryIO, Dict, Optional, Union
+
+from .archive_extractor import read_archive_images
+from .ebook_generator import build_epub
+from .error import VerifyFileError
+from .constants import SIMILARITY_THRESHOLD
+from .dedup import find_similar_pages, skip_duplicates
+from .image_processor import convert_images, get_output_name
+from .profile_processor import DEFAULT_PROFILE, get_profile
+
+DEFAULT_TITLE = "Untitled"
+
+
+def resolve_profile(profile: Union[Dict, str, None] = None) -> Dict:
+    """
+    Resolves a profile given as a dictionary, a profile file path or nothing.
+
+    Args:
+        profile (dict or str, optional): The profile options to merge over the
+            defaults, or a path to a profile file. Defaults to None.
+
+    Returns:
+        dict: A dictionary containing the profile information.
+    """
+    if isinstance(profile, dict):
+        resolved_profile = DEFAULT_PROFILE.copy()
+        resolved_profile.update(profile)
+        return resolved_profile
+
+    return get_profile(profile)
+
+
+def convert(
+    source: Union[bytes, BinaryIO],
+    profile: Union[Dict, str, None] = None,
+    output: Optional[BinaryIO] = None,
+    title: str = DEFAULT_TITLE,
+) -> Optional[bytes]:
+    """
+    Converts a comic book archive to an epub entirely in memory.
+
+    Nothing is written to disk: the archive is read from the given source, the
+    pages are converted in memory (see convert_images) and the epub is
+    assembled straight into the output stream. Identical pages are converted
+    and stored once, and similar pages dropped, as in process_images.
+
+    Args:
+        source (bytes or file-like): The .cbz or .cbr archive contents, or a
+            seekable binary stream to read them from.
+        profile (dict or str, optional): The profile options, or a path to a
+            profile file. Defaults to the default profile.
+        output (file-like, optional): A writable binary stream to write the epub
+            to. Defaults to None, in which case the epub is returned.
+        title (str, optional): The title of the book. Defaults to "Untitled".
+
+    Returns:
+        bytes: The epub contents, or None if it was written to output.
+
+    Raises:
+        VerifyFileError: If the source is not a valid archive or has no images.
+
+    Example:
+        >>> with open("book.cbz", "rb") as stream:
+        ...     epub = convert(stream, {"mono": True, "type": "jpg"})
+    """
+    profile = resolve_profile(profile)
+    image_type = profile.get("type", "jpg")
+
+    duplicates: Dict[str, str] = {}
+    images = read_archive_images(source)
+    if profile.get("deduplicate", True):
+        images = skip_duplicates(images, duplicates)
+
+    converted_images: Dict[str, bytes] = {}
+    convert_images(
+        profile,
+        images,
+        lambda _, image_path, data: converted_images.update(
+            {image_path: data}
+        ),
+    )
+
+    # Identical pages are only converted once, the copies share the result
+    images = [
+        (
+            get_output_name(image_path, image_type),
+            converted_images[duplicates.get(image_path, image_path)],
+        )
+        for image_path in sorted([*converted_images, *duplicates])
+    ]
+    duplicates = {
+        get_output_name(image_path, image_type): get_output_name(
+            original_path, image_type
+        )
+        for image_path, original_path in duplicates.items()
+    }
+    if not images:
+        raise VerifyFileError("Archive does not contain any images")
+
+    if profile.get("drop_similar_pages"):
+        similar_paths = set(
+            find_similar_pages(
+                images,
+                profile.get("similarity_threshold", SIMILARITY_THRESHOLD),
+            )
+        )
+        images = [image for image in images if image[0] not in similar_paths]
+
+    if output is not None:
+        build_epub(title, images, output, duplicates)
+        return None
+
+    stream = io.BytesIO()
+    build_epub(title, images, stream, duplicates)
+
+    return stream.getvalue()
+
+
+async def convert_async(
+    source: Union[bytes, BinaryIO],
+    profile: Union[Dict, str, None] = None,
+    output: Optional[BinaryIO] = None,
+    title: str = DEFAULT_TITLE,
+    executor: Optional[Executor] = None,
+) -> Optional[bytes]:
+    """
+    Converts a comic book archive to an epub without blocking the event loop.
+
+    The conversion is run by convert() in the given executor, or in the event
+    loop's default executor. When using a process pool, the source has to be
+    given as bytes and output left as None, as streams cannot be pickled.
+
+    Args:
+        source (bytes or file-like): The .cbz or .cbr archive contents, or a
+            seekable binary stream to read them from.
+        profile (dict or str, optional): The profile options, or a path to a
+            profile file. Defaults to the default profile.
+        output (file-like, optional): A writable binary stream to write the epub
+            to. Defaults to None, in which case the epub is returned.
+        title (str, optional): The title of the book. Defaults to "Untitled".
+        executor (Executor, optional): The executor to run the conversion in.
+            Defaults to the event loop's default executor.
+
+    Returns:
+        bytes: The epub contents, or None if it was written to output.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(convert, source, profile, output, title)
+    )
@@ -2,11 +2,24 @@
 archive_extractor.py
 author: slapelachie <slapelachie@gmail.com>
 """
+import io
+import mmap
 import os
+import struct
 import zipfile
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
 import rarfile
 
 from .error import VerifyFileError
+from .image_processor import IMAGE_EXTENSIONS, has_allowed_extension
+
+# Signature, versions, flags, method, time, date, crc, sizes, name and extra
+# field lengths of a zip member's local file header
+ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+ZIP_ENCRYPTED_FLAG = 0x1
 
 
 def extract_file(file_path: str, temp_directory: str) -> str:
@@ -42,3 +55,226 @@ def extract_file(file_path: str, temp_directory: str) -> str:
         raise ValueError("Unsupported archive type")
 
     return extract_directory
+
+
+def get_uncompressed_size(file_path: str) -> int:
+    """
+    Gets the total size of the files in a comic book archive once extracted.
+
+    Args:
+        file_path (str): The path to the comic book archive file.
+
+    Returns:
+        int: The uncompressed size of the archive's contents in bytes.
+    """
+    with open(file_path, "rb") as stream:
+        if zipfile.is_zipfile(stream):
+            archive_class = zipfile.ZipFile
+        elif rarfile.is_rarfile(stream):
+            archive_class = rarfile.RarFile
+        else:
+            raise VerifyFileError("File is not a cbz or cbr file")
+
+    with archive_class(file_path, "r") as archive:
+        return sum(info.file_size for info in archive.infolist())
+
+
+def get_image_members(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """
+    Gets the images in an archive.
+
+    Args:
+        archive (ZipFile or RarFile): The archive.
+
+    Returns:
+        List[ZipInfo or RarInfo]: The image members, in path order.
+    """
+    return sorted(
+        (
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and has_allowed_extension(info.filename, IMAGE_EXTENSIONS)
+        ),
+        key=lambda info: info.filename,
+    )
+
+
+def get_stored_member(
+    buffer: memoryview, info: zipfile.ZipInfo
+) -> Optional[memoryview]:
+    """
+    Gets the contents of an uncompressed zip member as a view of the archive,
+    without copying it.
+
+    Args:
+        buffer (memoryview): The whole zip archive.
+        info (ZipInfo): The member.
+
+    Returns:
+        memoryview: The member's contents, or None if it is compressed or
+            encrypted and has to be read normally.
+
+    Raises:
+        VerifyFileError: If the member's local header is corrupt or its
+            contents do not match their CRC-32, as ZipFile.read() would check.
+    """
+    if (
+        info.compress_type != zipfile.ZIP_STORED
+        or info.flag_bits & ZIP_ENCRYPTED_FLAG
+    ):
+        return None
+
+    header_end = info.header_offset + ZIP_LOCAL_HEADER.size
+    if header_end > len(buffer):
+        raise VerifyFileError(f"Bad local header for {info.filename}")
+    header = ZIP_LOCAL_HEADER.unpack(buffer[info.header_offset : header_end])
+    if header[0] != ZIP_LOCAL_SIGNATURE:
+        raise VerifyFileError(f"Bad local header for {info.filename}")
+
+    # The local extra field may differ from the central directory's
+    data_start = header_end + header[9] + header[10]
+    data_end = data_start + info.compress_size
+    if data_end > len(buffer):
+        raise VerifyFileError(f"Truncated archive member {info.filename}")
+
+    data = buffer[data_start:data_end]
+    if zlib.crc32(data) != info.CRC:
+        raise VerifyFileError(f"Bad CRC-32 for {info.filename}")
+
+    return data
+
+
+class MappedZipArchive:
+    """
+    A cbz archive mapped into memory, whose uncompressed (stored) images are
+    read as views of the mapping rather than copied. Compressed images are
+    decompressed as usual.
+
+    Views handed out stay valid after the archive is closed; the mapping is
+    unmapped once the last of them is released.
+
+    Attributes:
+        file_path (str): The path to the archive.
+        image_paths (List[str]): The paths of the images within the archive, in
+            page order.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._stream = open(  # pylint: disable=consider-using-with
+            file_path, "rb"
+        )
+        try:
+            self._archive = zipfile.ZipFile(self._stream, "r")
+            self._mapping = mmap.mmap(
+                self._stream.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except (zipfile.BadZipFile, ValueError) as error:
+            self._stream.close()
+            raise VerifyFileError("File is not a cbz file") from error
+
+        self._buffer = memoryview(self._mapping)
+        self._members = {
+            info.filename: info for info in get_image_members(self._archive)
+        }
+        self.image_paths = list(self._members)
+
+    def read(self, image_path: str) -> Union[memoryview, bytes]:
+        """
+        Reads an image from the archive.
+
+        Args:
+            image_path (str): The path of the image within the archive.
+
+        Returns:
+            memoryview or bytes: A view of the image if it is stored, otherwise
+                its decompressed contents.
+        """
+        info = self._members[image_path]
+        data = get_stored_member(self._buffer, info)
+        if data is None:
+            data = self._archive.read(info)
+
+        return data
+
+    def read_images(
+        self, image_paths: List[str]
+    ) -> Iterator[Tuple[str, Union[memoryview, bytes]]]:
+        """
+        Reads the given images from the archive.
+
+        Args:
+            image_paths (List[str]): The paths of the images to read.
+
+        Yields:
+            Tuple[str, memoryview or bytes]: The path and contents of each
+                image.
+        """
+        for image_path in image_paths:
+            yield image_path, self.read(image_path)
+
+    def close(self) -> None:
+        """
+        Closes the archive.
+
+        Returns:
+            None
+        """
+        self._archive.close()
+        self._buffer.release()
+        try:
+            self._mapping.close()
+        except BufferError:
+            # Views of images are still in use, they keep the mapping alive
+            pass
+        self._stream.close()
+
+    def __enter__(self) -> "MappedZipArchive":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def read_archive_images(
+    source: Union[bytes, BinaryIO]
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    Reads the images of a comic book archive (.cbz, .cbr) held in memory.
+
+    When the source is a cbz archive given as bytes, the uncompressed images
+    are yielded as views of it rather than copies.
+
+    Args:
+        source (bytes or file-like): The archive contents, or a seekable binary
+            stream to read them from.
+
+    Yields:
+        Tuple[str, bytes]: The path of each image within the archive and its
+            contents (bytes or a memoryview), in path order.
+
+    Raises:
+        VerifyFileError: If the source is not a cbz or cbr archive.
+    """
+    buffer = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        buffer = memoryview(source).cast("B")
+        source = io.BytesIO(source)
+
+    if zipfile.is_zipfile(source):
+        archive_class = zipfile.ZipFile
+    elif rarfile.is_rarfile(source):
+        archive_class = rarfile.RarFile
+    else:
+        raise VerifyFileError("File is not a cbz or cbr file")
+
+    source.seek(0)
+    with archive_class(source, "r") as archive:
+        for info in get_image_members(archive):
+            data = None
+            if buffer is not None and archive_class is zipfile.ZipFile:
+                data = get_stored_member(buffer, info)
+            if data is None:
+                data = archive.read(info)
+            yield info.filename, data
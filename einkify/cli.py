@@ -18,21 +18,138 @@ def parse_arguments() -> argparse.Namespace:
     )
 
     # Define the arguments
-    parser.add_argument("input_file", help="Path to input file")
     parser.add_argument(
-        "-i", "--input", dest="input_file", type=str, help=argparse.SUPPRESS
+        "input_files", nargs="*", help="Paths to the input files"
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        dest="input_files",
+        action="append",
+        type=str,
+        help=argparse.SUPPRESS,
     )
     parser.add_argument(
         "-o",
         "--output",
         dest="output_file",
         type=str,
-        help="Path to the output file",
+        help="Path to the output file, or directory when converting several files",
     )
     parser.add_argument("--profile", type=str, help="Profile to use")
     parser.add_argument(
         "--manga", action="store_true", help="If epub should be in rtl format"
     )
+    parser.add_argument(
+        "--split-size",
+        type=int,
+        help="Split the book into epubs of at most this many megabytes",
+    )
+    parser.add_argument(
+        "--split-pages",
+        type=int,
+        help="Split the book into epubs of at most this many pages",
+    )
+    parser.add_argument(
+        "--split-chapters",
+        action="store_true",
+        default=None,
+        help="Split the book at chapter folders, keeping chapters whole",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=str,
+        help="Directory to keep intermediate files in",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        help="Keep intermediate files in memory when they fit in this many "
+        "megabytes, 0 to always use disk",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Journal progress so an interrupted run resumes where it stopped",
+    )
+    parser.add_argument(
+        "--clean",
+        action="store_true",
+        help="Delete work left behind by interrupted runs and exit",
+    )
+    parser.add_argument(
+        "--spool",
+        type=str,
+        help="Shared spool directory to queue the input files in, or to take "
+        "books from with --worker",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Convert books queued in the spool directory until stopped",
+    )
+    parser.add_argument(
+        "--exit-when-empty",
+        action="store_true",
+        help="Stop the worker once the spool's queue is empty",
+    )
+    parser.add_argument(
+        "--lease-ttl",
+        type=float,
+        default=60,
+        help="Seconds before a silent worker's book is given to another worker",
+    )
 
     # Parse the arguments
+    arguments = parser.parse_args()
+    if arguments.worker and not arguments.spool:
+        parser.error("--worker requires --spool")
+    if not (arguments.input_files or arguments.clean or arguments.worker):
+        parser.error("the following arguments are required: input_files")
+
+    return arguments
+
+
+def parse_server_arguments() -> argparse.Namespace:
+    """
+    Parses the command-line arguments of the conversion server.
+
+    Returns:
+        argparse.Namespace: An object containing the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Server to convert uploaded manga into a kobo compatible format."
+    )
+
+    parser.add_argument(
+        "--host", type=str, default="127.0.0.1", help="Address to listen on"
+    )
+    parser.add_argument(
+        "--port", type=int, default=8080, help="Port to listen on"
+    )
+    parser.add_argument("--profile", type=str, help="Profile to use")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of conversion processes (defaults to the CPU count)",
+    )
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=8,
+        help="Maximum number of conversions in progress before refusing uploads",
+    )
+    parser.add_argument(
+        "--max-upload-size",
+        type=int,
+        default=512,
+        help="Maximum size of an upload in megabytes",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=2048,
+        help="Maximum megabytes of uploads and results held in memory",
+    )
+
     return parser.parse_args()
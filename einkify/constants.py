@@ -4,3 +4,5 @@ author: slapelachie <slapelachie@gmail.com>
 """
 MAX_DIMENSION = 100000
 ZOOM_FACTOR = 2
+MEGABYTE = 1024 * 1024
+SIMILARITY_THRESHOLD = 4
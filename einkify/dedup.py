@@ -0,0 +1,155 @@
+"""
+dedup.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+import hashlib
+import io
+import os
+import shutil
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from PIL import Image
+
+DHASH_SIZE = 8
+# Neighbouring thumbnail pixels closer than this count as equal, so that flat
+# pages (blank, single colour) hash the same despite scanner noise
+DHASH_TOLERANCE = 2
+
+
+def get_hash(data: bytes) -> str:
+    """
+    Gets a hash identifying the exact contents of an image.
+
+    Args:
+        data (bytes): The contents of the image.
+
+    Returns:
+        str: The hex digest of the contents.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_dhash(image: Image, hash_size: int = DHASH_SIZE) -> int:
+    """
+    Gets the difference hash (dHash) of an image.
+
+    The image is shrunk to a (hash_size + 1) x hash_size grayscale thumbnail and
+    each bit records whether a pixel is brighter than its right neighbour, so
+    visually similar images have hashes that differ in only a few bits.
+
+    Args:
+        image (PIL.Image): The image to hash.
+        hash_size (int, optional): The height of the thumbnail. Defaults to 8,
+            giving a 64 bit hash.
+
+    Returns:
+        int: The hash.
+    """
+    # Let JPEG decode at a reduced scale, the thumbnail is tiny anyway
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    thumbnail = image.convert("L").resize(
+        (hash_size + 1, hash_size), resample=Image.BOX
+    )
+    pixels = thumbnail.tobytes()
+
+    dhash = 0
+    for row in range(hash_size):
+        for column in range(hash_size):
+            left = pixels[row * (hash_size + 1) + column]
+            right = pixels[row * (hash_size + 1) + column + 1]
+            dhash = (dhash << 1) | (left - right > DHASH_TOLERANCE)
+
+    return dhash
+
+
+def hamming_distance(first_hash: int, second_hash: int) -> int:
+    """
+    Counts the bits that differ between two hashes.
+
+    Args:
+        first_hash (int): The first hash.
+        second_hash (int): The second hash.
+
+    Returns:
+        int: The number of differing bits.
+
+    Example:
+        >>> hamming_distance(0b1011, 0b0001)
+        2
+    """
+    return bin(first_hash ^ second_hash).count("1")
+
+
+def skip_duplicates(
+    images: Iterable[Tuple[str, bytes]], duplicates: Dict[str, str]
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    Passes through the first of each set of identical images.
+
+    Args:
+        images (Iterable[Tuple[str, bytes]]): The paths and contents of images.
+        duplicates (dict): Filled with the path of every skipped image, mapped
+            to the path of the identical image that was passed through.
+
+    Yields:
+        Tuple[str, bytes]: The path and contents of each distinct image.
+    """
+    original_paths: Dict[str, str] = {}
+    for image_path, data in images:
+        image_hash = get_hash(data)
+        if image_hash in original_paths:
+            duplicates[image_path] = original_paths[image_hash]
+            continue
+        original_paths[image_hash] = image_path
+        yield image_path, data
+
+
+def find_similar_pages(
+    images: Iterable[Tuple[str, bytes]], threshold: int
+) -> List[str]:
+    """
+    Finds pages that look the same as an earlier page, such as repeated credit
+    pages, adverts and blank pages.
+
+    Args:
+        images (Iterable[Tuple[str, bytes]]): The paths and contents of the
+            pages, in order.
+        threshold (int): The largest number of differing dHash bits for two
+            pages to count as the same.
+
+    Returns:
+        List[str]: The paths of the pages that repeat an earlier page.
+    """
+    similar_paths = []
+    seen_hashes: List[int] = []
+    for image_path, data in images:
+        dhash = get_dhash(Image.open(io.BytesIO(data)))
+        if any(
+            hamming_distance(dhash, seen_hash) <= threshold
+            for seen_hash in seen_hashes
+        ):
+            similar_paths.append(image_path)
+        else:
+            seen_hashes.append(dhash)
+
+    return similar_paths
+
+
+def link_file(source_path: str, destination_path: str) -> None:
+    """
+    Hard links a file to a new path, copying it where links are unsupported.
+
+    Args:
+        source_path (str): The file to link.
+        destination_path (str): The path of the new link.
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    if os.path.lexists(destination_path):
+        os.remove(destination_path)
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copy(source_path, destination_path)
@@ -1,29 +1,24 @@
+import io
 import os
 import shutil
 import tempfile
 import re
 import zipfile
-from typing import List, Tuple
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 from uuid import uuid4
+from xml.sax.saxutils import escape
 from datetime import datetime, timezone
 from PIL import Image
 
 from .image_processor import get_image_paths
 
+IMAGE_MEDIA_TYPES = {"jpg": "jpeg", "tif": "tiff"}
+
 
 def get_title(input_file: str) -> str:
     return os.path.splitext(os.path.basename(input_file))[0]
 
 
-def create_cover(image_path: str, output_directory: str) -> str:
-    cover_path = os.path.join(
-        output_directory, f"cover{os.path.splitext(image_path)[1]}"
-    )
-    shutil.copy(image_path, cover_path)
-
-    return cover_path
-
-
 def copy_images(
     image_path_maps: List[Tuple[str, str]],
     image_directory: str,
@@ -59,31 +54,68 @@ def map_paths(file_paths: List[str]) -> List[Tuple[str, str]]:
     return file_path_maps
 
 
+def get_media_type(image_path: str) -> str:
+    extension = os.path.splitext(image_path)[1][1:].lower()
+    return f"image/{IMAGE_MEDIA_TYPES.get(extension, extension)}"
+
+
+def create_style() -> List[str]:
+    return [
+        "@page {",
+        "margin: 0;",
+        "}",
+        "body {",
+        "display: block;",
+        "margin: 0;",
+        "padding: 0;",
+        "}",
+    ]
+
+
 def write_style_file(output_directory: str) -> str:
     style_file_path = os.path.join(output_directory, "style.css")
 
-    write_file(
-        style_file_path,
-        [
-            "@page {",
-            "margin: 0;",
-            "}",
-            "body {",
-            "display: block;",
-            "margin: 0;",
-            "padding: 0;",
-            "}",
-        ],
-    )
+    write_file(style_file_path, create_style())
 
     return style_file_path
 
 
+def create_image_xhtml(
+    flat_image_path: str,
+    width: int,
+    height: int,
+    stored_image_path: Optional[str] = None,
+) -> List[str]:
+    if stored_image_path is None:
+        stored_image_path = flat_image_path
+
+    return [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        "<!DOCTYPE html>",
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">',
+        "<head>",
+        f"<title>{os.path.splitext(flat_image_path)[0]}</title>",
+        '<link href="style.css" type="text/css" rel="stylesheet"/>',
+        f'<meta name="viewport" content="width={width}, height={height}"/>',
+        "</head>",
+        '<body style="">',
+        '<div style="text-align:center;top:0.0%;">',
+        f'<img width="{width}" height="{height}" src="../Images/{stored_image_path}"/>',
+        "</div>",
+        "</body>",
+        "</html>",
+    ]
+
+
 def write_image_xhtml_files(
     image_path_maps: List[Tuple[str, str]],
     image_directory: str,
     output_directory: str,
+    stored_image_paths: Optional[Dict[str, str]] = None,
 ) -> List[str]:
+    if stored_image_paths is None:
+        stored_image_paths = {}
+
     xhtml_paths = []
     for image_path_map in image_path_maps:
         image_path, flat_image_path = image_path_map
@@ -97,84 +129,112 @@ def write_image_xhtml_files(
 
         write_file(
             xhtml_path,
-            [
-                '<?xml version="1.0" encoding="UTF-8"?>',
-                "<!DOCTYPE html>",
-                '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">',
-                "<head>",
-                f"<title>{os.path.splitext(flat_image_path)[0]}</title>",
-                '<link href="style.css" type="text/css" rel="stylesheet"/>',
-                f'<meta name="viewport" content="width={width}, height={height}"/>',
-                "</head>",
-                '<body style="">',
-                '<div style="text-align:center;top:0.0%;">',
-                f'<img width="{width}" height="{height}" src="../Images/{flat_image_path}"/>',
-                "</div>",
-                "</body>",
-                "</html>",
-            ],
+            create_image_xhtml(
+                flat_image_path,
+                width,
+                height,
+                stored_image_paths.get(flat_image_path),
+            ),
         )
 
     return xhtml_paths
 
 
+def create_toc(
+    title: str,
+    book_uuid: str,
+    first_page_path: str,
+    chapters: Optional[List[Tuple[str, str]]] = None,
+) -> List[str]:
+    if not chapters:
+        chapters = [(title, first_page_path)]
+
+    # Pages before the first chapter folder are listed under the title
+    nav_points = [
+        f'<navPoint id="Text-{index}" playOrder="{index + 1}"><navLabel><text>{escape(label or title)}</text></navLabel><content src="Text/{page_path}"/></navPoint>'
+        for index, (label, page_path) in enumerate(chapters)
+    ]
+
+    return [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<ncx version="2005-1" xml:lang="en-US" xmlns="http://www.daisy.org/z3986/2005/ncx/">',
+        "<head>",
+        f'<meta name="dtb:uid" content="urn:uuid:{book_uuid}"/>',
+        '<meta name="dtb:totalPageCount" content="0"/>',
+        '<meta name="dtb:maxPageNumber" content="0"/>',
+        '<meta name="generated" content="true"/>',
+        "</head>",
+        f"<docTitle><text>{escape(title)}</text></docTitle>",
+        "<navMap>",
+        *nav_points,
+        "</navMap>",
+        "</ncx>",
+    ]
+
+
 def write_toc_file(
-    title: str, book_uuid: str, first_page_path: str, output_directory: str
+    title: str,
+    book_uuid: str,
+    first_page_path: str,
+    output_directory: str,
+    chapters: Optional[List[Tuple[str, str]]] = None,
 ) -> str:
     toc_path = os.path.join(output_directory, "toc.ncx")
 
     write_file(
-        toc_path,
-        [
-            '<?xml version="1.0" encoding="UTF-8"?>',
-            '<ncx version="2005-1" xml:lang="en-US" xmlns="http://www.daisy.org/z3986/2005/ncx/">',
-            "<head>",
-            f'<meta name="dtb:uid" content="urn:uuid:{book_uuid}"/>',
-            '<meta name="dtb:totalPageCount" content="0"/>',
-            '<meta name="dtb:maxPageNumber" content="0"/>',
-            '<meta name="generated" content="true"/>',
-            "</head>",
-            f"<docTitle><text>{title}</text></docTitle>",
-            "<navMap>",
-            f'<navPoint id="Text"><navLabel><text>{title}</text></navLabel><content src="Text/{first_page_path}"/></navPoint>',
-            "</navMap>",
-            "</ncx>",
-        ],
+        toc_path, create_toc(title, book_uuid, first_page_path, chapters)
     )
 
     return toc_path
 
 
+def create_nav(
+    title: str,
+    first_page_path: str,
+    chapters: Optional[List[Tuple[str, str]]] = None,
+) -> List[str]:
+    if not chapters:
+        chapters = [(title, first_page_path)]
+
+    # Pages before the first chapter folder are listed under the title
+    nav_items = [
+        f'<li><a href="Text/{page_path}">{escape(label or title)}</a></li>'
+        for label, page_path in chapters
+    ]
+
+    return [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        "<!DOCTYPE html>",
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">',
+        "<head>",
+        f"<title>{escape(title)}</title>",
+        '<meta charset="utf-8"/>',
+        "</head>",
+        "<body>",
+        '<nav xmlns:epub="http://www.idpf.org/2007/ops" epub:type="toc" id="toc">',
+        "<ol>",
+        *nav_items,
+        "</ol>",
+        "</nav>",
+        '<nav epub:type="page-list">',
+        "<ol>",
+        f'<li><a href="Text/{first_page_path}">{escape(title)}</a></li>',
+        "</ol>",
+        "</nav>",
+        "</body>",
+        "</html>",
+    ]
+
+
 def write_nav_file(
-    title: str, first_page_path: str, output_directory: str
+    title: str,
+    first_page_path: str,
+    output_directory: str,
+    chapters: Optional[List[Tuple[str, str]]] = None,
 ) -> str:
     nav_path = os.path.join(output_directory, "nav.xhtml")
 
-    write_file(
-        nav_path,
-        [
-            '<?xml version="1.0" encoding="utf-8"?>',
-            "<!DOCTYPE html>",
-            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">',
-            "<head>",
-            f"<title>{title}</title>",
-            '<meta charset="utf-8"/>',
-            "</head>",
-            "<body>",
-            '<nav xmlns:epub="http://www.idpf.org/2007/ops" epub:type="toc" id="toc">',
-            "<ol>",
-            f'<li><a href="Text/{first_page_path}">{title}</a></li>',
-            "</ol>",
-            "</nav>",
-            '<nav epub:type="page-list">',
-            "<ol>",
-            f'<li><a href="Text/{first_page_path}">{title}</a></li>',
-            "</ol>",
-            "</nav>",
-            "</body>",
-            "</html>",
-        ],
-    )
+    write_file(nav_path, create_nav(title, first_page_path, chapters))
 
     return nav_path
 
@@ -194,9 +254,10 @@ def generate_image_items(image_paths: List[str]) -> List[Tuple[str, str]]:
     image_items = []
 
     for image_path in image_paths:
-        image = Image.open(image_path)
         image_items.append(
-            generate_item(image_path, "img", "Images", image.format.lower())
+            generate_item(
+                image_path, "img", "Images", get_media_type(image_path)
+            )
         )
 
     return image_items
@@ -210,7 +271,7 @@ def generate_item(
     item_href = f"{href_dir}/{item_base}"
     return (
         item_id,
-        f'<item id="{item_id}" href="{item_href}" media-type="image/{media_type}"/>',
+        f'<item id="{item_id}" href="{item_href}" media-type="{media_type}"/>',
     )
 
 
@@ -222,7 +283,7 @@ def create_metadata(title: str, book_uuid: str) -> List[str]:
         '<?xml version="1.0" encoding="UTF-8"?>',
         '<package version="3.0" unique-identifier="BookID" xmlns="http://www.idpf.org/2007/opf">',
         '<metadata xmlns:opf="http://www.idpf.org/2007/opf" xmlns:dc="http://purl.org/dc/elements/1.1/">',
-        f"<dc:title>{title}</dc:title>",
+        f"<dc:title>{escape(title)}</dc:title>",
         "<dc:language>en-US</dc:language>",
         f'<dc:identifier id="BookID">urn:uuid:{book_uuid}</dc:identifier>',
         "<dc:creator>Unknown</dc:creator>",
@@ -238,13 +299,11 @@ def create_metadata(title: str, book_uuid: str) -> List[str]:
 def create_manifest(
     cover_image_path: str, xhtml_files: List[str], image_paths: List[str]
 ) -> List[str]:
-    cover_image = Image.open(cover_image_path)
-
+    cover_image_name = os.path.basename(cover_image_path)
     manifest_lines = [
         "<manifest>",
         '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>',
         '<item id="nav" href="nav.xhtml" properties="nav" media-type="application/xhtml+xml"/>',
-        f'<item id="cover" href="Images/{os.path.basename(cover_image_path)}" media-type="image/{cover_image.format.lower()}" properties="cover-image"/>',
         '<item id="css" href="Text/style.css" media-type="text/css"/>',
     ]
 
@@ -254,7 +313,14 @@ def create_manifest(
     for page_item in page_items:
         manifest_lines.append(page_item[1])
 
-    manifest_lines += [image_item[1] for image_item in image_items]
+    # The cover is a page's stored image, so it is listed once, as the cover
+    for image_path, image_item in zip(image_paths, image_items):
+        if os.path.basename(image_path) == cover_image_name:
+            manifest_lines.append(
+                f'<item id="cover" href="Images/{cover_image_name}" media-type="{get_media_type(cover_image_name)}" properties="cover-image"/>'
+            )
+        else:
+            manifest_lines.append(image_item[1])
     manifest_lines.append("</manifest>")
 
     return manifest_lines
@@ -284,7 +350,9 @@ def write_content_file(
     content_path = os.path.join(output_directory, "content.opf")
 
     metadata_lines = create_metadata(title, book_uuid)
-    manifest_lines = create_manifest(cover_image_path, xhtml_files, image_paths)
+    manifest_lines = create_manifest(
+        cover_image_path, xhtml_files, image_paths
+    )
     spine_lines = create_spine(xhtml_files)
 
     write_file(
@@ -293,20 +361,21 @@ def write_content_file(
     )
 
 
+def create_container() -> List[str]:
+    return [
+        '<?xml version="1.0"?>',
+        '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">',
+        "<rootfiles>",
+        '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>',
+        "</rootfiles>",
+        "</container>",
+    ]
+
+
 def write_container_file(output_directory: str) -> str:
     container_path = os.path.join(output_directory, "container.xml")
 
-    write_file(
-        container_path,
-        [
-            '<?xml version="1.0"?>',
-            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">',
-            "<rootfiles>",
-            '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>',
-            "</rootfiles>",
-            "</container>",
-        ],
-    )
+    write_file(container_path, create_container())
 
     return container_path
 
@@ -323,22 +392,33 @@ def create_epub(title: str, epub_directory: str, output_path: str) -> str:
     if not output_path:
         output_path = f"{title}.kepub.epub"
 
-    epub_file = zipfile.ZipFile(
-        output_path, mode="w", compression=zipfile.ZIP_DEFLATED
-    )
-
-    for root, _, files in os.walk(epub_directory):
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_file_path = os.path.relpath(file_path, epub_directory)
-            epub_file.write(file_path, arcname=relative_file_path)
-
-    epub_file.close()
+    # Write then rename, so an interrupted run never leaves a partial epub. The
+    # temporary file is unique to this writer, as another worker may be
+    # writing the same epub after taking over its lease
+    temp_path = f"{output_path}.{uuid4().hex}.tmp"
+    try:
+        with zipfile.ZipFile(
+            temp_path, mode="w", compression=zipfile.ZIP_DEFLATED
+        ) as epub_file:
+            for root, _, files in os.walk(epub_directory):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    relative_file_path = os.path.relpath(
+                        file_path, epub_directory
+                    )
+                    epub_file.write(file_path, arcname=relative_file_path)
+
+        os.replace(temp_path, output_path)
+    except BaseException:
+        # Nothing cleans up outside the state directory, so do it here
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
     return output_path
 
 
-def create_directories(parent_directory: str) -> List[str, str, str, str]:
+def create_directories(parent_directory: str) -> Tuple[str, str, str, str]:
     oebps_directory = os.path.join(parent_directory, "OEBPS")
     text_directory = os.path.join(oebps_directory, "Text")
     images_directory = os.path.join(oebps_directory, "Images")
@@ -350,48 +430,354 @@ def create_directories(parent_directory: str) -> List[str, str, str, str]:
     return oebps_directory, text_directory, images_directory, meta_directory
 
 
-def make_ebook(title: str, image_directory: str, output_path: str) -> str:
-    temp_directory = tempfile.TemporaryDirectory()
-    temp_epub_directory = os.path.join(temp_directory.name, "ebook")
-    book_uuid = str(uuid4())
+def get_book_duplicates(
+    duplicates: Dict[str, str], image_paths: List[str]
+) -> Dict[str, str]:
+    # The first copy in the book is stored, even when the original is not in it
+    book_duplicates = {}
+    stored_paths: Dict[str, str] = {}
+    for image_path in image_paths:
+        original_path = duplicates.get(image_path, image_path)
+        if original_path in stored_paths:
+            book_duplicates[image_path] = stored_paths[original_path]
+        else:
+            stored_paths[original_path] = image_path
+
+    return book_duplicates
+
+
+def get_stored_image_paths(
+    image_path_maps: List[Tuple[str, str]], duplicates: Dict[str, str]
+) -> Dict[str, str]:
+    flat_image_paths = dict(image_path_maps)
+    return {
+        flat_image_paths[image_path]: flat_image_paths[original_path]
+        for image_path, original_path in duplicates.items()
+        if original_path in flat_image_paths
+    }
+
+
+def get_chapter(image_path: str) -> str:
+    return os.path.dirname(os.path.normpath(image_path))
+
+
+def get_chapter_label(chapter: str, common_directory: str) -> str:
+    if chapter == common_directory:
+        return ""
+    return os.path.relpath(chapter, common_directory or ".")
+
+
+def get_chapters(
+    image_paths: List[str], xhtml_paths: List[str]
+) -> List[Tuple[str, str]]:
+    chapters = []
+    for image_path, xhtml_path in zip(image_paths, xhtml_paths):
+        chapter = get_chapter(image_path)
+        if not chapters or chapters[-1][0] != chapter:
+            chapters.append((chapter, os.path.basename(xhtml_path)))
+
+    # Folders shared by every page (e.g. a volume folder) are not chapters
+    common_directory = os.path.commonpath([chapter for chapter, _ in chapters])
+    chapters = [
+        (get_chapter_label(chapter, common_directory), page_path)
+        for chapter, page_path in chapters
+    ]
 
-    (
-        oebps_directory,
-        text_directory,
-        images_directory,
-        meta_directory,
-    ) = create_directories(temp_epub_directory)
+    # A book without chapter folders is listed under its title instead
+    if len(chapters) == 1 and not chapters[0][0]:
+        return []
 
-    image_paths = get_image_paths(image_directory)
-    image_path_maps = map_paths(image_paths)
+    return chapters
 
-    cover_image_path = create_cover(
-        os.path.join(image_directory, image_paths[0]), images_directory
-    )
-    new_image_paths = copy_images(
-        image_path_maps, image_directory, images_directory
-    )
-    xhtml_paths = write_image_xhtml_files(
-        image_path_maps, image_directory, text_directory
+
+def pack_pages(
+    image_paths: List[str],
+    image_sizes: Dict[str, int],
+    max_bytes: Optional[int],
+    max_pages: Optional[int],
+) -> List[List[str]]:
+    parts = []
+    part: List[str] = []
+    part_size = 0
+    for image_path in image_paths:
+        image_size = image_sizes[image_path]
+        if part and (
+            (max_bytes and part_size + image_size > max_bytes)
+            or (max_pages and len(part) >= max_pages)
+        ):
+            parts.append(part)
+            part, part_size = [], 0
+        part.append(image_path)
+        part_size += image_size
+
+    if part:
+        parts.append(part)
+
+    return parts
+
+
+def split_pages(
+    image_paths: List[str],
+    image_sizes: Dict[str, int],
+    max_bytes: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    by_chapter: bool = False,
+) -> List[List[str]]:
+    if not by_chapter:
+        return pack_pages(image_paths, image_sizes, max_bytes, max_pages)
+
+    chapters: List[List[str]] = []
+    for image_path in image_paths:
+        if not chapters or get_chapter(chapters[-1][0]) != get_chapter(
+            image_path
+        ):
+            chapters.append([])
+        chapters[-1].append(image_path)
+
+    if not (max_bytes or max_pages):
+        return chapters
+
+    # Fill each part with whole chapters, only splitting chapters that are
+    # over the limits on their own
+    parts: List[List[str]] = []
+    for chapter in chapters:
+        chapter_parts = pack_pages(chapter, image_sizes, max_bytes, max_pages)
+        if len(chapter_parts) == 1 and parts:
+            merged_parts = pack_pages(
+                parts[-1] + chapter, image_sizes, max_bytes, max_pages
+            )
+            if len(merged_parts) == 1:
+                parts[-1] = merged_parts[0]
+                continue
+        parts += chapter_parts
+
+    return parts
+
+
+def get_part_path(
+    title: str, output_path: Optional[str], part_number: int, part_count: int
+) -> str:
+    if not output_path:
+        output_path = f"{title}.kepub.epub"
+
+    extension = ""
+    for known_extension in [".kepub.epub", ".epub"]:
+        if output_path.lower().endswith(known_extension):
+            extension = output_path[-len(known_extension) :]
+            output_path = output_path[: -len(known_extension)]
+            break
+
+    return (
+        f"{output_path} - {get_part_label(part_number, part_count)}{extension}"
     )
 
-    first_page_path = os.path.basename(xhtml_paths[0])
 
-    write_style_file(text_directory)
-    write_toc_file(title, book_uuid, first_page_path, oebps_directory)
-    write_nav_file(title, first_page_path, oebps_directory)
-    write_content_file(
-        title,
-        book_uuid,
-        xhtml_paths,
-        new_image_paths,
-        cover_image_path,
-        oebps_directory,
+def get_part_label(part_number: int, part_count: int) -> str:
+    width = max(2, len(str(part_count)))
+    return f"Part {part_number:0{width}}"
+
+
+def make_ebooks(
+    title: str,
+    image_directory: str,
+    output_path: str,
+    max_bytes: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    by_chapter: bool = False,
+    duplicates: Optional[Dict[str, str]] = None,
+    temp_root: Optional[str] = None,
+) -> List[str]:
+    image_paths = get_image_paths(image_directory)
+    image_sizes = {
+        image_path: os.path.getsize(os.path.join(image_directory, image_path))
+        for image_path in image_paths
+    }
+    parts = split_pages(
+        image_paths, image_sizes, max_bytes, max_pages, by_chapter
     )
-    write_container_file(meta_directory)
-    write_mime_type_file(temp_epub_directory)
 
-    epub_file_path = create_epub(title, temp_epub_directory, output_path)
-    temp_directory.cleanup()
+    if len(parts) == 1:
+        return [
+            make_ebook(
+                title,
+                image_directory,
+                output_path,
+                parts[0],
+                duplicates,
+                temp_root,
+            )
+        ]
+
+    return [
+        make_ebook(
+            f"{title} - {get_part_label(part_number, len(parts))}",
+            image_directory,
+            get_part_path(title, output_path, part_number, len(parts)),
+            part,
+            duplicates,
+            temp_root,
+        )
+        for part_number, part in enumerate(parts, start=1)
+    ]
+
+
+def make_ebook(
+    title: str,
+    image_directory: str,
+    output_path: str,
+    image_paths: Optional[List[str]] = None,
+    duplicates: Optional[Dict[str, str]] = None,
+    temp_root: Optional[str] = None,
+) -> str:
+    with tempfile.TemporaryDirectory(dir=temp_root) as temp_directory:
+        temp_epub_directory = os.path.join(temp_directory, "ebook")
+        book_uuid = str(uuid4())
+
+        (
+            oebps_directory,
+            text_directory,
+            images_directory,
+            meta_directory,
+        ) = create_directories(temp_epub_directory)
+
+        if image_paths is None:
+            image_paths = get_image_paths(image_directory)
+        image_path_maps = map_paths(image_paths)
+
+        # Pages with identical images all refer to a single stored copy
+        duplicates = get_book_duplicates(duplicates or {}, image_paths)
+
+        # The first page is never a duplicate, its stored image is the cover
+        cover_image_path = os.path.join(
+            images_directory, image_path_maps[0][1]
+        )
+        new_image_paths = copy_images(
+            [
+                image_path_map
+                for image_path_map in image_path_maps
+                if image_path_map[0] not in duplicates
+            ],
+            image_directory,
+            images_directory,
+        )
+        xhtml_paths = write_image_xhtml_files(
+            image_path_maps,
+            image_directory,
+            text_directory,
+            get_stored_image_paths(image_path_maps, duplicates),
+        )
+
+        first_page_path = os.path.basename(xhtml_paths[0])
+        chapters = get_chapters(image_paths, xhtml_paths)
+
+        write_style_file(text_directory)
+        write_toc_file(
+            title, book_uuid, first_page_path, oebps_directory, chapters
+        )
+        write_nav_file(title, first_page_path, oebps_directory, chapters)
+        write_content_file(
+            title,
+            book_uuid,
+            xhtml_paths,
+            new_image_paths,
+            cover_image_path,
+            oebps_directory,
+        )
+        write_container_file(meta_directory)
+        write_mime_type_file(temp_epub_directory)
+
+        epub_file_path = create_epub(title, temp_epub_directory, output_path)
 
     return epub_file_path
+
+
+def join_lines(lines: List[str]) -> str:
+    return "".join([f"{line}\n" for line in lines])
+
+
+def build_epub(
+    title: str,
+    images: List[Tuple[str, bytes]],
+    output: Union[str, BinaryIO],
+    duplicates: Optional[Dict[str, str]] = None,
+) -> None:
+    book_uuid = str(uuid4())
+    image_path_maps = map_paths([image_path for image_path, _ in images])
+
+    # Pages with identical images all refer to a single stored copy
+    duplicates = get_book_duplicates(
+        duplicates or {}, [image_path for image_path, _ in images]
+    )
+    stored_image_paths = get_stored_image_paths(image_path_maps, duplicates)
+
+    # The first page is never a duplicate, its stored image is the cover
+    cover_image_path = image_path_maps[0][1]
+    xhtml_paths = [
+        f"Text/{os.path.splitext(flat_image_path)[0]}.xhtml"
+        for _, flat_image_path in image_path_maps
+    ]
+    image_paths = [
+        f"Images/{flat_image_path}"
+        for image_path, flat_image_path in image_path_maps
+        if image_path not in duplicates
+    ]
+    first_page_path = os.path.basename(xhtml_paths[0])
+    chapters = get_chapters(
+        [image_path for image_path, _ in images], xhtml_paths
+    )
+
+    with zipfile.ZipFile(
+        output, mode="w", compression=zipfile.ZIP_DEFLATED
+    ) as epub_file:
+        # The mimetype entry has to come first and uncompressed
+        epub_file.writestr(
+            "mimetype",
+            "application/epub+zip",
+            compress_type=zipfile.ZIP_STORED,
+        )
+        epub_file.writestr(
+            "META-INF/container.xml", join_lines(create_container())
+        )
+        epub_file.writestr(
+            "OEBPS/content.opf",
+            join_lines(
+                create_metadata(title, book_uuid)
+                + create_manifest(cover_image_path, xhtml_paths, image_paths)
+                + create_spine(xhtml_paths)
+            ),
+        )
+        epub_file.writestr(
+            "OEBPS/toc.ncx",
+            join_lines(
+                create_toc(title, book_uuid, first_page_path, chapters)
+            ),
+        )
+        epub_file.writestr(
+            "OEBPS/nav.xhtml",
+            join_lines(create_nav(title, first_page_path, chapters)),
+        )
+        epub_file.writestr("OEBPS/Text/style.css", join_lines(create_style()))
+
+        # Images are already compressed, deflating them again is wasted work
+        for (_, data), (_, flat_image_path), xhtml_path in zip(
+            images, image_path_maps, xhtml_paths
+        ):
+            width, height = Image.open(io.BytesIO(data)).size
+            epub_file.writestr(
+                f"OEBPS/{xhtml_path}",
+                join_lines(
+                    create_image_xhtml(
+                        flat_image_path,
+                        width,
+                        height,
+                        stored_image_paths.get(flat_image_path),
+                    )
+                ),
+            )
+            if flat_image_path in stored_image_paths:
+                continue
+            epub_file.writestr(
+                f"OEBPS/Images/{flat_image_path}",
+                data,
+                compress_type=zipfile.ZIP_STORED,
+            )
@@ -17,3 +17,34 @@ class VerifyFileError(Exception):
 
     def __str__(self):
         return f"{self.message}"
+
+
+class ServerBusyError(Exception):
+    """
+    Raised when the conversion server cannot accept another job.
+
+    Attributes:
+        message (str): The error message associated with the exception.
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return f"{self.message}"
+
+
+class ScratchSpaceError(Exception):
+    """
+    Raised when there is not enough free space to hold a conversion's
+    intermediate files.
+
+    Attributes:
+        message (str): The error message associated with the exception.
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return f"{self.message}"
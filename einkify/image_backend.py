@@ -0,0 +1,144 @@
+"""
+image_backend.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+from .constants import MAX_DIMENSION, ZOOM_FACTOR
+
+
+def get_max_size(profile: Dict) -> Tuple[int, int]:
+    """
+    Gets the bounding box pages are shrunk to fit in.
+
+    Args:
+        profile (dict): The conversion profile.
+
+    Returns:
+        Tuple[int, int]: The largest width and height of a page.
+    """
+    max_dimension = profile.get("max_dimension", MAX_DIMENSION) * profile.get(
+        "zoom_factor", ZOOM_FACTOR
+    )
+    return max_dimension, max_dimension
+
+
+class ImageBackend(ABC):
+    """
+    The pixel work of converting a page, done by an image library.
+
+    Subclasses implement the individual operations on the library's own image
+    type, and convert_page() and convert_data() chain them into a page
+    conversion. A subclass missing an operation cannot be instantiated.
+
+    Attributes:
+        name (str): The name the backend is selected by in a profile.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def open(self, data: bytes, max_size: Optional[Tuple[int, int]] = None):
+        """
+        Decodes an image.
+
+        Args:
+            data (bytes-like): The encoded image.
+            max_size (Tuple[int, int], optional): The bounding box the image
+                will be shrunk to fit in. Backends that can decode at a reduced
+                size may use it to avoid decoding every pixel.
+
+        Returns:
+            The decoded image.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def convert(self, image: Any, mono: bool) -> Any:
+        """
+        Converts an image to the colour mode pages are saved in.
+
+        Args:
+            image: The image.
+            mono (bool): Whether to convert the image to grayscale.
+
+        Returns:
+            The converted image.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def resize(self, image: Any, max_size: Tuple[int, int]) -> Any:
+        """
+        Shrinks an image to fit in a bounding box, keeping its aspect ratio.
+        Images that already fit are not enlarged.
+
+        Args:
+            image: The image.
+            max_size (Tuple[int, int]): The largest width and height.
+
+        Returns:
+            The resized image.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def tone(self, image: Any, profile: Dict) -> Any:
+        """
+        Applies the profile's tone adjustments (see get_tone_lut).
+
+        Args:
+            image: The image.
+            profile (dict): The conversion profile.
+
+        Returns:
+            The adjusted image.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode(self, image: Any, image_type: str) -> bytes:
+        """
+        Encodes an image.
+
+        Args:
+            image: The image.
+            image_type (str): The type to encode as (e.g. 'jpg', 'png').
+
+        Returns:
+            bytes: The encoded image.
+        """
+        raise NotImplementedError
+
+    def convert_page(self, image: Any, profile: Dict) -> Any:
+        """
+        Converts a decoded page according to a profile.
+
+        Args:
+            image: The page.
+            profile (dict): The conversion profile.
+
+        Returns:
+            The converted page.
+        """
+        image = self.convert(image, profile.get("mono", False))
+        image = self.resize(image, get_max_size(profile))
+        # Toning after resizing touches the fewest pixels
+        return self.tone(image, profile)
+
+    def convert_data(self, profile: Dict, data: bytes) -> bytes:
+        """
+        Decodes, converts and re-encodes a page according to a profile.
+
+        Args:
+            profile (dict): The conversion profile.
+            data (bytes-like): The encoded page.
+
+        Returns:
+            bytes: The converted page, encoded as the profile's image type.
+        """
+        image = self.open(data, get_max_size(profile))
+        image = self.convert_page(image, profile)
+
+        return self.encode(image, profile.get("type", "jpg"))
@@ -2,12 +2,38 @@
 image_processor.py
 author: slapelachie <slapelachie@gmail.com>
 """
+import functools
+import io
 import os
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from PIL import Image
 
-from .constants import MAX_DIMENSION, ZOOM_FACTOR
+from .constants import SIMILARITY_THRESHOLD
+from .dedup import find_similar_pages, link_file, skip_duplicates
+from .image_backend import ImageBackend
+from .journal import WorkDirectory
+from .pipeline import run_pipeline
+
+IMAGE_EXTENSIONS = [
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".bmp",
+    ".gif",
+    ".tiff",
+    ".webp",
+]
+IMAGE_FORMATS = {"jpg": "JPEG", "tif": "TIFF"}
+IDENTITY_LUT = tuple(range(256))
+# The colour band count and whether there is an alpha band, for each mode that
+# can be toned with a lookup table
+TONE_MODES = {
+    "L": (1, False),
+    "LA": (1, True),
+    "RGB": (3, False),
+    "RGBA": (3, True),
+}
 
 
 def has_allowed_extension(
@@ -43,18 +69,9 @@ def get_image_paths(image_directory: str) -> List[str]:
         image_directory: A string representing the path to the directory containing the images.
 
     Returns:
-        A list of relative image file paths with allowed extensions in the directory.
+        A list of relative image file paths with allowed extensions in the directory,
+        sorted in page order.
     """
-    allowed_extensions = [
-        ".jpg",
-        ".jpeg",
-        ".png",
-        ".bmp",
-        ".gif",
-        ".tiff",
-        ".webp",
-    ]
-
     if not os.path.exists(image_directory):
         raise FileNotFoundError("Specified image_directory does not exist")
 
@@ -63,10 +80,10 @@ def get_image_paths(image_directory: str) -> List[str]:
         for file in files:
             full_path = os.path.join(root, file)
             relative_path = os.path.relpath(full_path, image_directory)
-            if has_allowed_extension(relative_path, allowed_extensions):
+            if has_allowed_extension(relative_path, IMAGE_EXTENSIONS):
                 image_paths.append(relative_path)
 
-    return image_paths
+    return sorted(image_paths)
 
 
 def convert_image(image: Image, profile: Dict) -> Image:
@@ -80,17 +97,353 @@ def convert_image(image: Image, profile: Dict) -> Image:
     Returns:
         PIL.Image: The converted image.
     """
-    if profile.get("mono"):
-        image = image.convert("L")
+    return get_backend(PillowBackend.name).convert_page(image, profile)
+
+
+@functools.lru_cache(maxsize=32)
+def build_tone_lut(
+    gamma: float = 1.0, black_point: int = 0, white_point: int = 255
+) -> Tuple[int, ...]:
+    """
+    Builds a lookup table mapping each 8-bit level to its toned level.
+
+    Levels at or below the black point become black, levels at or above the
+    white point become white, and the levels between are stretched to fill the
+    full range and gamma corrected. A gamma below 1 darkens the midtones, as in
+    ImageMagick's -gamma.
+
+    Args:
+        gamma (float, optional): The gamma correction. Defaults to 1.0.
+        black_point (int, optional): The input level mapped to black.
+            Defaults to 0.
+        white_point (int, optional): The input level mapped to white.
+            Defaults to 255.
+
+    Returns:
+        Tuple[int, ...]: The 256 output levels.
+
+    Example:
+        >>> build_tone_lut(1.0, 0, 255)[128]
+        128
+        >>> build_tone_lut(1.0, 64, 192)[128]
+        128
+    """
+    if gamma <= 0:
+        raise ValueError("Gamma must be greater than 0")
+    if not 0 <= black_point < white_point <= 255:
+        raise ValueError(
+            "Black and white points must satisfy 0 <= black < white <= 255"
+        )
+
+    lut = []
+    for level in range(256):
+        normalised = (level - black_point) / (white_point - black_point)
+        normalised = min(max(normalised, 0.0), 1.0)
+        lut.append(round(255 * normalised ** (1 / gamma)))
+
+    return tuple(lut)
+
+
+def get_autocontrast_levels(
+    histogram: List[int], cutoff: float = 0
+) -> Tuple[int, int]:
+    """
+    Finds the darkest and lightest levels in use, ignoring outliers.
+
+    Args:
+        histogram (List[int]): The 256 level pixel counts of a grayscale image.
+        cutoff (float, optional): The percentage of pixels to ignore at each
+            end of the histogram. Defaults to 0.
+
+    Returns:
+        Tuple[int, int]: The darkest and lightest levels, or (0, 255) if the
+            image is a single level.
+    """
+    ignored_count = sum(histogram) * cutoff / 100
+
+    low = 0
+    count = 0
+    for low, level_count in enumerate(histogram):
+        count += level_count
+        if count > ignored_count:
+            break
+
+    high = 255
+    count = 0
+    for high in range(255, -1, -1):
+        count += histogram[high]
+        if count > ignored_count:
+            break
+
+    if low >= high:
+        return 0, 255
 
-    max_dimension = profile.get("max_dimension", MAX_DIMENSION) * profile.get(
-        "zoom_factor", ZOOM_FACTOR
+    return low, high
+
+
+def get_tone_lut(
+    profile: Dict, histogram: Optional[List[int]] = None
+) -> Tuple[int, ...]:
+    """
+    Gets the lookup table for the tone adjustments of a profile.
+
+    Args:
+        profile (dict): The conversion profile.
+        histogram (List[int], optional): The grayscale histogram of the image,
+            required when the profile enables autocontrast. Defaults to None.
+
+    Returns:
+        Tuple[int, ...]: The 256 output levels.
+    """
+    black_point = profile.get("black_point", 0)
+    white_point = profile.get("white_point", 255)
+
+    if profile.get("autocontrast") and histogram is not None:
+        low, high = get_autocontrast_levels(
+            histogram, profile.get("autocontrast_cutoff", 0)
+        )
+        black_point = max(black_point, low)
+        white_point = min(white_point, high)
+        if black_point >= white_point:
+            black_point, white_point = (
+                profile.get("black_point", 0),
+                profile.get("white_point", 255),
+            )
+
+    return build_tone_lut(
+        float(profile.get("gamma", 1.0)), black_point, white_point
     )
-    image.thumbnail((max_dimension, max_dimension), resample=Image.LANCZOS)
+
+
+def apply_tone(image: Image, profile: Dict) -> Image:
+    """
+    Applies the profile's gamma, black/white point and autocontrast adjustments
+    in a single pass over the image, using a lookup table.
+
+    Args:
+        image (PIL.Image): The image to adjust.
+        profile (dict): The conversion profile.
+
+    Returns:
+        PIL.Image: The adjusted image, or the input image if the profile makes
+            no adjustments.
+    """
+    histogram = None
+    if profile.get("autocontrast"):
+        histogram = (
+            image if image.mode == "L" else image.convert("L")
+        ).histogram()
+
+    lut = get_tone_lut(profile, histogram)
+    if lut == IDENTITY_LUT:
+        return image
+
+    if image.mode not in TONE_MODES:
+        image = image.convert("RGB")
+
+    # Colour bands share the table, alpha is left untouched
+    band_count, has_alpha = TONE_MODES[image.mode]
+    return image.point(lut * band_count + IDENTITY_LUT * has_alpha)
+
+
+def get_image_format(image_type: str) -> str:
+    """
+    Get the Pillow format name for the given image type.
+
+    Args:
+        image_type (str): The type of the image (e.g. 'jpg', 'png').
+
+    Returns:
+        str: The format name Pillow expects when saving.
+
+    Example:
+        >>> get_image_format("jpg")
+        'JPEG'
+        >>> get_image_format("webp")
+        'WEBP'
+    """
+    image_type = image_type.lower()
+    return IMAGE_FORMATS.get(image_type, image_type.upper())
+
+
+def prepare_image(image: Image, image_format: str) -> Image:
+    """
+    Converts the image to a mode that can be saved in the given format.
+
+    Args:
+        image (PIL.Image): The image to prepare.
+        image_format (str): The Pillow format name the image will be saved as.
+
+    Returns:
+        PIL.Image: The image, converted to RGB if the format requires it.
+    """
+    if image_format == "JPEG" and image.mode not in ["L", "RGB", "CMYK"]:
+        return image.convert("RGB")
 
     return image
 
 
+def encode_image(image: Image, image_type: str) -> bytes:
+    """
+    Encodes the given image with the specified type.
+
+    Args:
+        image (PIL.Image): The image to encode.
+        image_type (str): The type of the image to encode (e.g. 'jpg', 'png').
+
+    Returns:
+        bytes: The encoded image.
+    """
+    image_format = get_image_format(image_type)
+
+    stream = io.BytesIO()
+    prepare_image(image, image_format).save(stream, format=image_format)
+
+    return stream.getvalue()
+
+
+class BufferReader(io.RawIOBase):
+    """
+    A read-only binary stream over a buffer, such as a memoryview of a memory
+    mapped archive.
+
+    Unlike io.BytesIO, the buffer is not copied up front; only the chunks read
+    from the stream are.
+
+    Attributes:
+        buffer (memoryview): The contents of the stream.
+    """
+
+    def __init__(self, buffer: bytes):
+        super().__init__()
+        self.buffer = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        start = min(self._position, len(self.buffer))
+        end = (
+            len(self.buffer)
+            if size < 0
+            else min(start + size, len(self.buffer))
+        )
+        self._position = end
+        return bytes(self.buffer[start:end])
+
+    def readinto(self, target) -> int:
+        # Copy straight from the buffer, without an intermediate bytes object
+        target = memoryview(target).cast("B")
+        start = min(self._position, len(self.buffer))
+        end = min(start + len(target), len(self.buffer))
+        target[: end - start] = self.buffer[start:end]
+        self._position = end
+        return end - start
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self.buffer) + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def open_image(data: bytes) -> Image:
+    """
+    Opens an encoded image held in memory without copying it.
+
+    Args:
+        data (bytes-like): The encoded image, e.g. bytes or a memoryview.
+
+    Returns:
+        PIL.Image: The image.
+    """
+    return Image.open(BufferReader(data))
+
+
+class PillowBackend(ImageBackend):
+    """
+    The default image backend, decoding whole images with Pillow.
+    """
+
+    name = "pillow"
+
+    def open(self, data: bytes, max_size: Optional[Tuple[int, int]] = None):
+        return open_image(data)
+
+    def convert(self, image: Image, mono: bool) -> Image:
+        return image.convert("L") if mono else image
+
+    def resize(self, image: Image, max_size: Tuple[int, int]) -> Image:
+        image.thumbnail(max_size, resample=Image.LANCZOS)
+        return image
+
+    def tone(self, image: Image, profile: Dict) -> Image:
+        return apply_tone(image, profile)
+
+    def encode(self, image: Image, image_type: str) -> bytes:
+        return encode_image(image, image_type)
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(name: Optional[str] = None) -> ImageBackend:
+    """
+    Gets the image backend with the given name.
+
+    Args:
+        name (str, optional): "pillow" or "vips". Defaults to None, meaning
+            Pillow.
+
+    Returns:
+        ImageBackend: The backend.
+
+    Raises:
+        ValueError: If there is no backend with the name.
+        ImportError: If the backend's image library is not installed.
+    """
+    if name in [None, PillowBackend.name]:
+        return PillowBackend()
+    if name == "vips":
+        # pyvips is optional, so it is only imported when asked for
+        from .vips_backend import (  # pylint: disable=import-outside-toplevel
+            VipsBackend,
+        )
+
+        return VipsBackend()
+
+    raise ValueError(f"Unknown image backend '{name}'")
+
+
+def convert_image_data(profile: Dict, data: bytes) -> bytes:
+    """
+    Decodes, converts and re-encodes an image held in memory, using the
+    profile's image backend.
+
+    Args:
+        profile (dict): The conversion profile.
+        data (bytes-like): The encoded input image.
+
+    Returns:
+        bytes: The converted image, encoded as the profile's image type.
+    """
+    return get_backend(profile.get("backend")).convert_data(profile, data)
+
+
 def save_image(
     image: Image, output_directory: str, image_path: str, image_type: str
 ) -> None:
@@ -106,32 +459,250 @@ def save_image(
     Returns:
         None.
     """
-    image_out_path = os.path.join(output_directory, image_path)
+    image_out_path = get_output_path(output_directory, image_path, image_type)
     os.makedirs(os.path.dirname(image_out_path), exist_ok=True)
-    image.save(
-        f"{os.path.splitext(os.path.join(output_directory, image_path))[0]}.{image_type}",
-        format=image_type,
+    image_format = get_image_format(image_type)
+    # Write then rename, so an interrupted save never leaves a partial image
+    prepare_image(image, image_format).save(
+        f"{image_out_path}.tmp", format=image_format
     )
+    os.replace(f"{image_out_path}.tmp", image_out_path)
+
+
+def get_output_name(image_path: str, image_type: str) -> str:
+    """
+    Gets the relative path an image is saved as.
+
+    Args:
+        image_path: The relative path of the image within the input directory.
+        image_type: The type the image is saved as (e.g. 'jpg', 'png').
+
+    Returns:
+        str: The relative path of the saved image.
+    """
+    return f"{os.path.splitext(image_path)[0]}.{image_type}"
+
+
+def get_output_path(
+    output_directory: str, image_path: str, image_type: str
+) -> str:
+    """
+    Gets the path an image is saved to in the output directory.
+
+    Args:
+        output_directory: The directory images are saved to.
+        image_path: The relative path of the image within the input directory.
+        image_type: The type the image is saved as (e.g. 'jpg', 'png').
+
+    Returns:
+        str: The path of the saved image.
+    """
+    return os.path.join(
+        output_directory, get_output_name(image_path, image_type)
+    )
+
+
+def save_image_data(
+    data: bytes, output_directory: str, image_path: str, image_type: str
+) -> None:
+    """
+    Saves an already encoded image with the specified type to the output
+    directory.
+
+    Args:
+        data: The encoded image to save.
+        output_directory: The directory to save the image to.
+        image_path: The relative path of the image within the input directory.
+        image_type: The type the image was encoded as (e.g. 'jpg', 'png').
+
+    Returns:
+        None.
+    """
+    image_out_path = get_output_path(output_directory, image_path, image_type)
+    os.makedirs(os.path.dirname(image_out_path), exist_ok=True)
+    # Write then rename, so an interrupted save never leaves a partial image
+    with open(f"{image_out_path}.tmp", "wb") as stream:
+        stream.write(data)
+    os.replace(f"{image_out_path}.tmp", image_out_path)
+
+
+def read_images(
+    image_directory: str, image_paths: List[str]
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    Reads the given images from a directory.
+
+    Args:
+        image_directory: The directory containing the images.
+        image_paths: The relative paths of the images to read.
 
+    Yields:
+        Tuple[str, bytes]: The relative path of each image and its contents.
+    """
+    for image_path in image_paths:
+        with open(os.path.join(image_directory, image_path), "rb") as stream:
+            yield image_path, stream.read()
 
-def process_images(profile: Dict, image_directory: str) -> str:
+
+def process_images(
+    profile: Dict,
+    image_directory: str,
+    work_directory: Optional[WorkDirectory] = None,
+) -> str:
     """
     Processes images in a given directory according to a given profile.
 
     Args:
     - profile (dict): A dictionary containing the parameters of the image processing profile.
     - image_directory (str): The directory containing the images to be processed.
+    - work_directory (WorkDirectory, optional): The work directory to journal
+      converted pages in.
 
     Returns:
     - output_directory (str): The directory containing the processed images.
     """
-    output_directory = os.path.join(os.path.dirname(image_directory), "convert")
-    image_paths = get_image_paths(image_directory)
-
-    for image_path in image_paths:
-        image = Image.open(os.path.join(image_directory, image_path))
-        image = convert_image(image, profile)
-        image_type = profile.get("type", "jpg")
-        save_image(image, output_directory, image_path, image_type)
+    output_directory = os.path.join(
+        os.path.dirname(image_directory), "convert"
+    )
+    convert_pages(
+        profile,
+        get_image_paths(image_directory),
+        functools.partial(read_images, image_directory),
+        output_directory,
+        work_directory,
+    )
 
     return output_directory
+
+
+def convert_images(
+    profile: Dict,
+    images: Iterable[Tuple[str, bytes]],
+    sink: Callable[[int, str, bytes], None],
+) -> None:
+    """
+    Converts images according to a given profile, handing each result to sink.
+
+    Unless the profile disables "pipeline", the images are converted in a
+    threaded pipeline (see run_pipeline) using the profile's "workers" threads,
+    otherwise one at a time, in order.
+
+    Args:
+        profile (dict): The image processing profile.
+        images (Iterable[Tuple[str, bytes]]): The paths and contents of the
+            images.
+        sink (Callable): Called with each image's index, its path and its
+            converted contents.
+
+    Returns:
+        None
+    """
+    if profile.get("pipeline", True):
+        run_pipeline(
+            images,
+            lambda _, data: convert_image_data(profile, data),
+            sink,
+            workers=profile.get("workers"),
+        )
+        return
+
+    for index, (image_path, data) in enumerate(images):
+        sink(index, image_path, convert_image_data(profile, data))
+
+
+def convert_pages(
+    profile: Dict,
+    image_paths: List[str],
+    read_pages: Callable[[List[str]], Iterable[Tuple[str, bytes]]],
+    output_directory: str,
+    work_directory: Optional[WorkDirectory] = None,
+) -> Dict[str, str]:
+    """
+    Converts the pages of a book according to a given profile.
+
+    Unless the profile disables "pipeline", reading, converting and writing the
+    images are overlapped in a threaded pipeline (see convert_images).
+
+    Unless the profile disables "deduplicate", images identical to an earlier
+    image are not converted again but linked to its converted copy, and the
+    duplicates are returned so the epub can store them once. When the
+    profile enables "drop_similar_pages", converted pages that look the same as
+    an earlier page (see find_similar_pages) are removed.
+
+    When given a work directory, each converted page is recorded in its journal
+    and pages recorded by an earlier, interrupted run are not converted again.
+
+    Args:
+    - profile (dict): A dictionary containing the parameters of the image processing profile.
+    - image_paths (List[str]): The relative paths of the pages, in order.
+    - read_pages (callable): Reads the given pages, yielding the path and
+      contents (bytes or a memoryview) of each.
+    - output_directory (str): The directory to save the converted pages to.
+    - work_directory (WorkDirectory, optional): The work directory to journal
+      converted pages in.
+
+    Returns:
+    - duplicates (dict): The saved path of every duplicate page, relative to
+      the output directory, mapped to the saved path of its original.
+    """
+    image_type = profile.get("type", "jpg")
+
+    def complete_page(
+        image_path: str, original_path: Optional[str] = None
+    ) -> None:
+        if work_directory is not None:
+            work_directory.complete_page(image_path, original_path)
+
+    def save_page(_: int, image_path: str, data: bytes) -> None:
+        save_image_data(data, output_directory, image_path, image_type)
+        complete_page(image_path)
+
+    duplicates: Dict[str, str] = {}
+    if work_directory is not None:
+        completed_pages = work_directory.completed_pages
+        duplicates.update(
+            (image_path, original_path)
+            for image_path, original_path in work_directory.duplicates.items()
+            if image_path in completed_pages
+        )
+        image_paths = [
+            image_path
+            for image_path in image_paths
+            if not (
+                image_path in completed_pages
+                and os.path.exists(
+                    get_output_path(output_directory, image_path, image_type)
+                )
+            )
+        ]
+
+    new_duplicates: Dict[str, str] = {}
+    images = read_pages(image_paths)
+    if profile.get("deduplicate", True):
+        images = skip_duplicates(images, new_duplicates)
+
+    convert_images(profile, images, save_page)
+
+    # Identical pages are only converted once, the copies link to the result
+    for image_path, original_path in new_duplicates.items():
+        link_file(
+            get_output_path(output_directory, original_path, image_type),
+            get_output_path(output_directory, image_path, image_type),
+        )
+        complete_page(image_path, original_path)
+    duplicates.update(new_duplicates)
+
+    if profile.get("drop_similar_pages"):
+        output_paths = get_image_paths(output_directory)
+        for similar_path in find_similar_pages(
+            read_images(output_directory, output_paths),
+            profile.get("similarity_threshold", SIMILARITY_THRESHOLD),
+        ):
+            os.remove(os.path.join(output_directory, similar_path))
+
+    return {
+        get_output_name(image_path, image_type): get_output_name(
+            original_path, image_type
+        )
+        for image_path, original_path in duplicates.items()
+    }
@@ -0,0 +1,241 @@
+"""
+journal.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Set
+
+from .profile_processor import RUNTIME_OPTIONS
+
+STATE_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "einkify",
+    "work",
+)
+JOURNAL_NAME = "journal.jsonl"
+LOCK_NAME = ".lock"
+
+
+def get_work_key(*parts: str) -> str:
+    """
+    Gets a stable name for the work of the given parts.
+
+    Args:
+        *parts (str): The values identifying the work.
+
+    Returns:
+        str: A hex digest of the parts.
+    """
+    return hashlib.sha256("\0".join(parts).encode("UTF-8")).hexdigest()[:32]
+
+
+def get_book_key(input_file: str, profile: Dict) -> str:
+    """
+    Gets the work key of converting a book with a profile.
+
+    The key changes whenever the archive is modified or the profile changes, so
+    stale work is never resumed.
+
+    Args:
+        input_file (str): The path to the comic book archive.
+        profile (dict): The conversion profile.
+
+    Returns:
+        str: The work key.
+    """
+    stat = os.stat(input_file)
+    return get_work_key(
+        os.path.abspath(input_file),
+        str(stat.st_size),
+        str(stat.st_mtime_ns),
+        json.dumps(
+            {
+                option: value
+                for option, value in profile.items()
+                if option not in RUNTIME_OPTIONS
+            },
+            sort_keys=True,
+        ),
+    )
+
+
+class Journal:
+    """
+    An append-only log of completed work, kept as JSON lines.
+
+    Each record is flushed and synced to disk before record() returns, so after
+    a crash the journal lists exactly the work that was finished. A partly
+    written last line (from a crash mid-write) is ignored.
+
+    Attributes:
+        path (str): The path to the journal file.
+        entries (List[dict]): The records, oldest first.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: List[Dict] = []
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="UTF-8") as stream:
+                for line in stream:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+
+    def record(self, event: str, **data) -> None:
+        """
+        Appends a record to the journal.
+
+        Args:
+            event (str): The kind of work that was completed.
+            **data: Details of the work.
+
+        Returns:
+            None
+        """
+        entry = {"event": event, **data}
+        with open(self.path, "a", encoding="UTF-8") as stream:
+            stream.write(f"{json.dumps(entry)}\n")
+            stream.flush()
+            os.fsync(stream.fileno())
+
+        self.entries.append(entry)
+
+    def events(self, event: str) -> List[Dict]:
+        """
+        Gets the records of a kind of work.
+
+        Args:
+            event (str): The kind of work.
+
+        Returns:
+            List[dict]: The matching records, oldest first.
+        """
+        return [entry for entry in self.entries if entry["event"] == event]
+
+
+class WorkDirectory:
+    """
+    A directory holding the intermediate files of a book (or the state of a
+    batch of books), with a journal of the work done in it.
+
+    The directory is locked while in use, so a second process cannot work in it
+    at the same time and clean_work_directories() can tell it is not abandoned.
+
+    Attributes:
+        path (str): The path to the directory.
+        journal (Journal): The journal of the work done in the directory.
+    """
+
+    def __init__(self, root_directory: str, key: str):
+        self.path = os.path.join(root_directory, key)
+        os.makedirs(self.path, exist_ok=True)
+
+        self._lock_stream = open(  # pylint: disable=consider-using-with
+            os.path.join(self.path, LOCK_NAME), "w", encoding="UTF-8"
+        )
+        try:
+            fcntl.flock(self._lock_stream, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as error:
+            self._lock_stream.close()
+            raise RuntimeError(
+                f"Work directory {self.path} is in use by another process"
+            ) from error
+
+        self.journal = Journal(os.path.join(self.path, JOURNAL_NAME))
+
+    @property
+    def completed_pages(self) -> Set[str]:
+        """
+        Set[str]: The relative paths of the pages already converted.
+        """
+        return {entry["path"] for entry in self.journal.events("page")}
+
+    @property
+    def duplicates(self) -> Dict[str, str]:
+        """
+        dict: The relative paths of the pages completed as duplicates, mapped
+            to the paths of the identical pages they were linked to.
+        """
+        return {
+            entry["path"]: entry["original"]
+            for entry in self.journal.events("page")
+            if "original" in entry
+        }
+
+    def complete_page(
+        self, image_path: str, original_path: Optional[str] = None
+    ) -> None:
+        """
+        Records that a page has been converted.
+
+        Args:
+            image_path (str): The relative path of the page.
+            original_path (str, optional): The relative path of the identical
+                page it was linked to, if it is a duplicate. Defaults to None.
+
+        Returns:
+            None
+        """
+        if original_path is None:
+            self.journal.record("page", path=image_path)
+        else:
+            self.journal.record(
+                "page", path=image_path, original=original_path
+            )
+
+    def release(self) -> None:
+        """
+        Unlocks the directory, keeping its contents so the work can be resumed.
+
+        Returns:
+            None
+        """
+        if not self._lock_stream.closed:
+            self._lock_stream.close()
+
+    def cleanup(self) -> None:
+        """
+        Unlocks and deletes the directory.
+
+        Returns:
+            None
+        """
+        self.release()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def clean_work_directories(root_directory: str = STATE_DIRECTORY) -> List[str]:
+    """
+    Deletes work directories that no running process is using.
+
+    Args:
+        root_directory (str, optional): The directory holding the work
+            directories. Defaults to STATE_DIRECTORY.
+
+    Returns:
+        List[str]: The paths of the deleted directories.
+    """
+    if not os.path.isdir(root_directory):
+        return []
+
+    removed_paths = []
+    for name in sorted(os.listdir(root_directory)):
+        path = os.path.join(root_directory, name)
+        if not os.path.isdir(path):
+            continue
+
+        try:
+            work_directory = WorkDirectory(root_directory, name)
+        except RuntimeError:
+            continue
+        work_directory.cleanup()
+        removed_paths.append(path)
+
+    return removed_paths
@@ -0,0 +1,140 @@
+"""
+pipeline.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+import os
+import queue
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+# Marks the end of a stage's output
+_DONE = object()
+# How often blocked stages check whether the pipeline has been stopped
+_POLL_INTERVAL = 0.1
+
+
+def _put(target: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def _get(source: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return source.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+
+    return _DONE
+
+
+def run_pipeline(
+    source: Iterable[Tuple[str, bytes]],
+    transform: Callable[[str, bytes], Any],
+    sink: Callable[[int, str, Any], None],
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+) -> None:
+    """
+    Runs items through overlapped read, transform and write stages.
+
+    A reader thread pulls items from the source, a pool of worker threads
+    transforms them and the calling thread hands the results to the sink, in the
+    order they finish. The stages are joined by bounded queues, so at most
+    around 2 * queue_size + workers items are held in memory at once, however
+    large the source is.
+
+    Threads suit image work because Pillow releases the GIL while decoding,
+    resizing and encoding.
+
+    Args:
+        source (Iterable[Tuple[str, bytes]]): The paths and contents to process.
+        transform (Callable): Called with each path and its contents, returning
+            the result to write.
+        sink (Callable): Called with each item's index in the source, its path
+            and the transformed result.
+        workers (int, optional): The number of transform threads. Defaults to
+            the CPU count.
+        queue_size (int, optional): The capacity of each queue. Defaults to
+            twice the number of workers.
+
+    Returns:
+        None
+
+    Raises:
+        Exception: The first exception raised by any stage.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or workers * 2
+
+    read_queue: queue.Queue = queue.Queue(queue_size)
+    write_queue: queue.Queue = queue.Queue(queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def fail(error: BaseException) -> None:
+        errors.append(error)
+        stop.set()
+
+    def read() -> None:
+        items = iter(source)
+        try:
+            for index, (path, data) in enumerate(items):
+                if not _put(read_queue, (index, path, data), stop):
+                    return
+        except BaseException as error:  # pylint: disable=broad-except
+            fail(error)
+            return
+        finally:
+            # Release the source (e.g. an open archive) even when stopped early
+            if hasattr(items, "close"):
+                items.close()
+
+        for _ in range(workers):
+            _put(read_queue, _DONE, stop)
+
+    def work() -> None:
+        try:
+            while True:
+                item = _get(read_queue, stop)
+                if item is _DONE:
+                    break
+                index, path, data = item
+                result = transform(path, data)
+                if not _put(write_queue, (index, path, result), stop):
+                    return
+        except BaseException as error:  # pylint: disable=broad-except
+            fail(error)
+            return
+
+        _put(write_queue, _DONE, stop)
+
+    threads = [threading.Thread(target=read, daemon=True)] + [
+        threading.Thread(target=work, daemon=True) for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        finished_workers = 0
+        while finished_workers < workers and not stop.is_set():
+            item = _get(write_queue, stop)
+            if item is _DONE:
+                finished_workers += 1
+                continue
+            sink(*item)
+    except BaseException as error:
+        fail(error)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
@@ -7,15 +7,34 @@ from typing import Dict, Optional
 
 import yaml
 
-from .constants import MAX_DIMENSION, ZOOM_FACTOR
+from .constants import MAX_DIMENSION, SIMILARITY_THRESHOLD, ZOOM_FACTOR
 from .error import VerifyFileError
 
+# Options that change how a book is converted but not the epub it produces
+RUNTIME_OPTIONS = ("pipeline", "workers", "workdir", "memory_budget")
+
 DEFAULT_PROFILE = {
     "mono": False,
     "type": "jpg",
     "max_width": MAX_DIMENSION,
     "max_height": MAX_DIMENSION,
     "zoom_factor": ZOOM_FACTOR,
+    "pipeline": True,
+    "workers": None,
+    "split_size": None,
+    "split_pages": None,
+    "split_chapters": False,
+    "deduplicate": True,
+    "drop_similar_pages": False,
+    "similarity_threshold": SIMILARITY_THRESHOLD,
+    "gamma": 1.0,
+    "black_point": 0,
+    "white_point": 255,
+    "autocontrast": False,
+    "autocontrast_cutoff": 0,
+    "workdir": None,
+    "memory_budget": 512,
+    "backend": "pillow",
 }
 
 
@@ -0,0 +1,226 @@
+"""
+scratch.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+import os
+import shutil
+import signal
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence
+
+from .archive_extractor import get_uncompressed_size
+from .constants import MEGABYTE
+from .error import ScratchSpaceError
+from .journal import STATE_DIRECTORY
+
+RAM_DIRECTORY = "/dev/shm"
+SCRATCH_PREFIX = "einkify-"
+# The extracted pages, the converted pages and the staged epub are all in
+# scratch at the same time. Pages of cbz archives are read in place instead of
+# being extracted.
+SCRATCH_FACTOR = 3
+MAPPED_SCRATCH_FACTOR = 2
+
+
+def get_required_space(input_file: str) -> int:
+    """
+    Estimates the scratch space needed to convert a comic book archive.
+
+    Args:
+        input_file (str): The path to the comic book archive.
+
+    Returns:
+        int: The estimated space in bytes.
+    """
+    if zipfile.is_zipfile(input_file):
+        return get_uncompressed_size(input_file) * MAPPED_SCRATCH_FACTOR
+
+    return get_uncompressed_size(input_file) * SCRATCH_FACTOR
+
+
+def get_free_space(directory: str) -> int:
+    """
+    Gets the space available to unprivileged users on a directory's filesystem.
+
+    Args:
+        directory (str): The directory.
+
+    Returns:
+        int: The free space in bytes.
+    """
+    return shutil.disk_usage(directory).free
+
+
+def get_available_memory() -> int:
+    """
+    Gets the physical memory that is currently free.
+
+    Returns:
+        int: The free memory in bytes, or 0 if it cannot be determined.
+    """
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+
+def check_free_space(directory: str, required_space: int) -> None:
+    """
+    Checks that a directory has room for a conversion's intermediate files.
+
+    Args:
+        directory (str): The directory.
+        required_space (int): The space needed in bytes.
+
+    Returns:
+        None
+
+    Raises:
+        ScratchSpaceError: If the directory's filesystem is too full.
+    """
+    free_space = get_free_space(directory)
+    if free_space < required_space:
+        raise ScratchSpaceError(
+            f"Not enough space in {directory}: "
+            f"{-(-required_space // MEGABYTE)} MB needed, "
+            f"{free_space // MEGABYTE} MB free"
+        )
+
+
+def fits_in_memory(required_space: int, memory_budget: Optional[int]) -> bool:
+    """
+    Checks whether intermediate files can be kept on the RAM backed tmpfs.
+
+    Args:
+        required_space (int): The space needed in bytes.
+        memory_budget (int, optional): The most memory to use in megabytes, or
+            None to never use memory.
+
+    Returns:
+        bool: True if the files fit the budget, the free memory and the tmpfs.
+    """
+    if not memory_budget or not os.path.isdir(RAM_DIRECTORY):
+        return False
+
+    return required_space <= min(
+        memory_budget * MEGABYTE,
+        get_available_memory(),
+        get_free_space(RAM_DIRECTORY),
+    )
+
+
+def get_scratch_root(
+    required_space: int,
+    workdir: Optional[str] = None,
+    memory_budget: Optional[int] = None,
+) -> str:
+    """
+    Picks the directory to keep a conversion's intermediate files in.
+
+    An explicit work directory always wins. Otherwise the RAM backed tmpfs is
+    used when the files fit the memory budget, falling back to the system
+    temporary directory.
+
+    Args:
+        required_space (int): The space needed in bytes.
+        workdir (str, optional): The directory chosen by the user.
+        memory_budget (int, optional): The most memory to use in megabytes.
+
+    Returns:
+        str: The directory.
+
+    Raises:
+        ScratchSpaceError: If the directory's filesystem is too full.
+    """
+    if workdir:
+        os.makedirs(workdir, exist_ok=True)
+        root_directory = workdir
+    elif fits_in_memory(required_space, memory_budget):
+        return RAM_DIRECTORY
+    else:
+        root_directory = tempfile.gettempdir()
+
+    check_free_space(root_directory, required_space)
+    return root_directory
+
+
+def get_state_directory(workdir: Optional[str] = None) -> str:
+    """
+    Gets the directory to keep resumable work in.
+
+    Resumable work is never kept in memory, as it has to outlive the process.
+
+    Args:
+        workdir (str, optional): The directory chosen by the user.
+
+    Returns:
+        str: The directory.
+    """
+    if workdir:
+        return os.path.join(workdir, "einkify")
+
+    return STATE_DIRECTORY
+
+
+@contextmanager
+def scratch_directory(
+    input_file: str,
+    workdir: Optional[str] = None,
+    memory_budget: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Creates a directory for the intermediate files of converting a comic book
+    archive, deleting it once the conversion succeeds or fails.
+
+    Args:
+        input_file (str): The path to the comic book archive.
+        workdir (str, optional): The directory chosen by the user.
+        memory_budget (int, optional): The most memory to use in megabytes.
+
+    Yields:
+        str: The path to the directory.
+
+    Raises:
+        ScratchSpaceError: If there is no room for the intermediate files.
+    """
+    root_directory = get_scratch_root(
+        get_required_space(input_file), workdir, memory_budget
+    )
+    with tempfile.TemporaryDirectory(
+        prefix=SCRATCH_PREFIX, dir=root_directory
+    ) as temp_directory:
+        yield temp_directory
+
+
+def _exit(signal_number: int, _frame) -> None:
+    raise SystemExit(128 + signal_number)
+
+
+@contextmanager
+def exit_on_signals(
+    signal_numbers: Sequence[int] = (signal.SIGTERM, signal.SIGHUP)
+) -> Iterator[None]:
+    """
+    Turns termination signals into SystemExit, so that the cleanup in finally
+    blocks and context managers runs when the process is killed.
+
+    Must be entered from the main thread.
+
+    Args:
+        signal_numbers (Sequence[int], optional): The signals to handle.
+            Defaults to SIGTERM and SIGHUP.
+
+    Yields:
+        None
+    """
+    previous_handlers = {
+        signal_number: signal.signal(signal_number, _exit)
+        for signal_number in signal_numbers
+    }
+    try:
+        yield
+    finally:
+        for signal_number, handler in previous_handlers.items():
+            signal.signal(signal_number, handler)
@@ -0,0 +1,579 @@
+"""
+server.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+import json
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from uuid import uuid4
+
+from .api import DEFAULT_TITLE, convert, resolve_profile
+from .cli import parse_server_arguments
+from .constants import MEGABYTE
+from .error import ServerBusyError
+
+CHUNK_SIZE = 64 * 1024
+
+
+def warm_up() -> None:
+    """
+    Imports the conversion dependencies in a worker process ahead of any job.
+
+    Returns:
+        None
+    """
+    # pylint: disable=import-outside-toplevel
+    from PIL import Image
+
+    Image.init()
+
+
+class Job:
+    """
+    A conversion job submitted to the server.
+
+    Attributes:
+        job_id (str): The identifier of the job.
+        title (str): The title of the book being converted.
+        upload_size (int): The size of the uploaded archive in bytes.
+        future (Future): The future of the running conversion.
+        result (bytes): The converted epub, once the job is done.
+        error (str): The reason the job failed, if it did.
+        finished_at (float): The time the job finished, if it has.
+        removed (bool): Whether the job was removed while it was running.
+    """
+
+    def __init__(self, title: str, upload_size: int, future: Future):
+        self.job_id = str(uuid4())
+        self.title = title
+        self.upload_size = upload_size
+        self.future = future
+        self.result: Optional[bytes] = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        self.removed = False
+
+    @property
+    def status(self) -> str:
+        """
+        str: One of "pending", "done" or "failed".
+        """
+        if self.error is not None:
+            return "failed"
+        if self.result is not None:
+            return "done"
+        return "pending"
+
+    def to_dict(self) -> Dict:
+        """
+        Describes the job for a status response.
+
+        Returns:
+            dict: The job identifier, title and status, plus the error or
+                result size when there is one.
+        """
+        description = {
+            "id": self.job_id,
+            "title": self.title,
+            "status": self.status,
+        }
+        if self.error is not None:
+            description["error"] = self.error
+        if self.result is not None:
+            description["size"] = len(self.result)
+            description["download"] = f"/jobs/{self.job_id}/epub"
+
+        return description
+
+
+class ConversionService:
+    """
+    Runs conversions in a warm process pool, bounding jobs and memory held.
+
+    Memory is accounted as the size of every upload being received or waiting
+    to be converted plus every converted epub waiting to be downloaded. Jobs
+    that would exceed either bound are refused with a ServerBusyError instead
+    of being queued.
+
+    An upload holds a reservation (see reserve()) from before its body is read
+    until it is submitted or released, so concurrent uploads cannot together
+    exceed the bounds.
+
+    Attributes:
+        profile (dict): The profile used for every conversion, with one
+            pipeline worker per conversion.
+        max_jobs (int): The maximum number of unfinished jobs.
+        max_upload_size (int): The maximum size of an upload in bytes.
+        max_memory (int): The maximum number of bytes held by jobs.
+        result_ttl (float): Seconds a finished job is kept before it expires.
+    """
+
+    def __init__(
+        self,
+        profile: Dict,
+        workers: Optional[int] = None,
+        max_jobs: int = 8,
+        max_upload_size: int = 512 * MEGABYTE,
+        max_memory: int = 2048 * MEGABYTE,
+        result_ttl: float = 3600,
+    ):
+        # The process pool already converts books in parallel, a thread pool
+        # per process on top of it would oversubscribe the CPUs
+        self.profile = {**profile, "workers": 1}
+        self.max_jobs = max_jobs
+        self.max_upload_size = max_upload_size
+        self.max_memory = max_memory
+        self.result_ttl = result_ttl
+
+        self._workers = workers
+        self._jobs: Dict[str, Job] = {}
+        self._reservations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._executor = self._start_executor()
+
+    def _start_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self._workers)
+        # pylint: disable=protected-access
+        for _ in range(executor._max_workers):
+            executor.submit(warm_up)
+        return executor
+
+    def _memory_used(self) -> int:
+        return sum(self._reservations.values()) + sum(
+            len(job.result) if job.result is not None else job.upload_size
+            for job in self._jobs.values()
+            if job.error is None
+        )
+
+    def _expire_jobs(self) -> None:
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if (
+                job.finished_at is not None
+                and now - job.finished_at > self.result_ttl
+            ):
+                del self._jobs[job_id]
+
+    def _check_capacity(self, upload_size: int) -> None:
+        if upload_size < 0:
+            raise ValueError("Upload size cannot be negative")
+        if upload_size > self.max_upload_size:
+            raise ValueError("Upload is larger than the maximum upload size")
+
+        self._expire_jobs()
+        unfinished_jobs = len(self._reservations) + sum(
+            1 for job in self._jobs.values() if job.status == "pending"
+        )
+        if unfinished_jobs >= self.max_jobs:
+            raise ServerBusyError("Too many conversions in progress")
+        if self._memory_used() + upload_size > self.max_memory:
+            raise ServerBusyError("Not enough memory for the conversion")
+
+    def reserve(self, upload_size: int) -> str:
+        """
+        Reserves a job slot and memory for an upload of the given size, before
+        its body is read.
+
+        The reservation counts towards the bounds until it is passed to
+        submit() or release().
+
+        Args:
+            upload_size (int): The size of the upload in bytes.
+
+        Returns:
+            str: The identifier of the reservation.
+
+        Raises:
+            ValueError: If the upload size is negative or larger than the
+                maximum upload size.
+            ServerBusyError: If there are too many jobs or too much memory held.
+        """
+        with self._lock:
+            self._check_capacity(upload_size)
+            reservation = str(uuid4())
+            self._reservations[reservation] = upload_size
+            return reservation
+
+    def release(self, reservation: str) -> None:
+        """
+        Releases a reservation that was not submitted. Releasing a submitted
+        reservation does nothing.
+
+        Args:
+            reservation (str): The identifier of the reservation.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._reservations.pop(reservation, None)
+
+    def _submit_conversion(self, data: bytes, title: str) -> Future:
+        try:
+            return self._executor.submit(
+                convert, data, self.profile, None, title
+            )
+        except BrokenProcessPool:
+            # A worker process died (e.g. killed for using too much memory),
+            # replace the pool rather than failing every later job
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._start_executor()
+            return self._executor.submit(
+                convert, data, self.profile, None, title
+            )
+
+    def submit(
+        self,
+        data: bytes,
+        title: str = DEFAULT_TITLE,
+        reservation: Optional[str] = None,
+    ) -> Job:
+        """
+        Submits an archive for conversion.
+
+        Args:
+            data (bytes): The .cbz or .cbr archive contents.
+            title (str, optional): The title of the book. Defaults to "Untitled".
+            reservation (str, optional): The reservation made for the upload,
+                which is used up. Defaults to None, checking the bounds anew.
+
+        Returns:
+            Job: The submitted job.
+
+        Raises:
+            ValueError: If the upload is larger than the maximum upload size,
+                or than its reservation.
+            ServerBusyError: If there are too many jobs or too much memory held.
+        """
+        with self._lock:
+            if reservation is None:
+                self._check_capacity(len(data))
+            elif len(data) > self._reservations.get(reservation, -1):
+                raise ValueError("Upload is larger than its reservation")
+            self._reservations.pop(reservation, None)
+
+            future = self._submit_conversion(data, title)
+            job = Job(title, len(data), future)
+            self._jobs[job.job_id] = job
+
+        future.add_done_callback(lambda _: self._finish(job))
+
+        return job
+
+    def _finish(self, job: Job) -> None:
+        with self._lock:
+            if job.removed:
+                self._jobs.pop(job.job_id, None)
+                return
+            if job.future.cancelled():
+                job.error = "Cancelled"
+                job.finished_at = time.monotonic()
+                return
+            try:
+                job.result = job.future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                job.error = str(error) or type(error).__name__
+            job.finished_at = time.monotonic()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Gets a job by its identifier.
+
+        Args:
+            job_id (str): The identifier of the job.
+
+        Returns:
+            Job: The job, or None if it does not exist or has expired.
+        """
+        with self._lock:
+            self._expire_jobs()
+            job = self._jobs.get(job_id)
+            return None if job is None or job.removed else job
+
+    def remove(self, job_id: str) -> Optional[Job]:
+        """
+        Removes a job, releasing the memory held by its result. A job that is
+        already running keeps counting towards the bounds until it finishes.
+
+        Args:
+            job_id (str): The identifier of the job.
+
+        Returns:
+            Job: The removed job, or None if it did not exist.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.removed:
+                return None
+            job.removed = True
+
+        # Cancelling runs _finish in this thread, so it must not hold the lock
+        if job.future.cancel() or job.future.done():
+            with self._lock:
+                self._jobs.pop(job_id, None)
+
+        return job
+
+    def shutdown(self) -> None:
+        """
+        Stops the process pool, cancelling jobs that have not started.
+
+        Returns:
+            None
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to the conversion server.
+
+    Endpoints:
+        POST /jobs?title=<title>: Uploads an archive (the request body) and
+            starts converting it. Responds 202 with the job status.
+        GET /jobs/<id>: Responds with the job status.
+        GET /jobs/<id>/epub: Streams the converted epub.
+        DELETE /jobs/<id>: Removes the job and its result.
+    """
+
+    server_version = "einkify"
+    service: ConversionService
+
+    def send_json(
+        self,
+        status: HTTPStatus,
+        body: Dict,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Sends a JSON response.
+
+        Args:
+            status (HTTPStatus): The response status.
+            body (dict): The object to send as JSON.
+            headers (dict, optional): Extra headers to send. Defaults to None.
+
+        Returns:
+            None
+        """
+        content = json.dumps(body).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_error_json(self, status: HTTPStatus, message: str, **kwargs):
+        """
+        Sends a JSON error response.
+
+        Args:
+            status (HTTPStatus): The response status.
+            message (str): The error message.
+
+        Returns:
+            None
+        """
+        self.send_json(status, {"error": message}, **kwargs)
+
+    def parse_path(self) -> Tuple[list, Dict]:
+        """
+        Splits the request path into its segments and query parameters.
+
+        Returns:
+            Tuple[list, dict]: The path segments and query parameters.
+        """
+        url = urlparse(self.path)
+        return [part for part in url.path.split("/") if part], parse_qs(
+            url.query
+        )
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """
+        Gets a job, responding 404 if it does not exist.
+
+        Args:
+            job_id (str): The identifier of the job.
+
+        Returns:
+            Job: The job, or None if a 404 response was sent.
+        """
+        job = self.service.get(job_id)
+        if job is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "Job not found")
+
+        return job
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Handles job uploads.
+        """
+        parts, query = self.parse_path()
+        if parts != ["jobs"]:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "Not found")
+            return
+
+        try:
+            content_length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.send_error_json(
+                HTTPStatus.LENGTH_REQUIRED, "Content-Length is required"
+            )
+            return
+        if content_length < 0:
+            self.send_error_json(
+                HTTPStatus.BAD_REQUEST, "Content-Length cannot be negative"
+            )
+            return
+
+        # Refuse before reading the body so rejected uploads cost nothing
+        try:
+            reservation = self.service.reserve(content_length)
+        except ValueError as error:
+            self.send_error_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(error)
+            )
+            return
+        except ServerBusyError as error:
+            self.send_error_json(
+                HTTPStatus.TOO_MANY_REQUESTS,
+                str(error),
+                headers={"Retry-After": "5"},
+            )
+            return
+
+        title = query.get("title", [DEFAULT_TITLE])[0]
+        try:
+            data = self.rfile.read(content_length)
+            job = self.service.submit(data, title, reservation)
+        except ValueError as error:
+            self.send_error_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(error)
+            )
+            return
+        finally:
+            self.service.release(reservation)
+
+        self.send_json(
+            HTTPStatus.ACCEPTED,
+            job.to_dict(),
+            headers={"Location": f"/jobs/{job.job_id}"},
+        )
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Handles job status requests and epub downloads.
+        """
+        parts, _ = self.parse_path()
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = self.get_job(parts[1])
+            if job is not None:
+                self.send_json(HTTPStatus.OK, job.to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "epub":
+            job = self.get_job(parts[1])
+            if job is None:
+                return
+            if job.result is None:
+                self.send_error_json(
+                    HTTPStatus.CONFLICT, f"Job is {job.status}"
+                )
+                return
+            self.send_epub(job)
+        else:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "Not found")
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """
+        Handles job removal.
+        """
+        parts, _ = self.parse_path()
+        if len(parts) == 2 and parts[0] == "jobs":
+            if self.service.remove(parts[1]) is None:
+                self.send_error_json(HTTPStatus.NOT_FOUND, "Job not found")
+                return
+            self.send_response(HTTPStatus.NO_CONTENT)
+            self.end_headers()
+        else:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "Not found")
+
+    def send_epub(self, job: Job) -> None:
+        """
+        Streams the converted epub of a job in chunks.
+
+        Args:
+            job (Job): The finished job.
+
+        Returns:
+            None
+        """
+        result = memoryview(job.result)
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/epub+zip")
+        self.send_header("Content-Length", str(len(result)))
+        self.send_header(
+            "Content-Disposition",
+            f'attachment; filename="{job.job_id}.kepub.epub"',
+        )
+        self.end_headers()
+        for offset in range(0, len(result), CHUNK_SIZE):
+            self.wfile.write(result[offset : offset + CHUNK_SIZE])
+
+
+def create_server(
+    service: ConversionService, host: str = "127.0.0.1", port: int = 8080
+) -> ThreadingHTTPServer:
+    """
+    Creates an HTTP server that handles requests with the given service.
+
+    Args:
+        service (ConversionService): The service running the conversions.
+        host (str, optional): The address to listen on. Defaults to 127.0.0.1.
+        port (int, optional): The port to listen on. Defaults to 8080.
+
+    Returns:
+        ThreadingHTTPServer: The server, ready to serve_forever().
+    """
+    handler = type(
+        "Handler", (ConversionRequestHandler,), {"service": service}
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main() -> None:
+    """
+    Runs the conversion server until interrupted.
+
+    Returns:
+        None
+    """
+    arguments = parse_server_arguments()
+
+    service = ConversionService(
+        resolve_profile(arguments.profile),
+        workers=arguments.workers,
+        max_jobs=arguments.max_jobs,
+        max_upload_size=arguments.max_upload_size * MEGABYTE,
+        max_memory=arguments.max_memory * MEGABYTE,
+    )
+    server = create_server(service, arguments.host, arguments.port)
+    print(f"Serving on http://{arguments.host}:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+spool.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from .journal import get_book_key, get_work_key
+from .profile_processor import RUNTIME_OPTIONS
+
+QUEUE_DIRECTORY = "queue"
+LEASE_DIRECTORY = "leases"
+DONE_DIRECTORY = "done"
+FAILED_DIRECTORY = "failed"
+LEASE_TTL = 60
+# Profile options each host chooses for itself, rather than taking from the job
+HOST_OPTIONS = (*RUNTIME_OPTIONS, "backend")
+
+
+def get_worker_id() -> str:
+    """
+    Gets a name for this worker that is unique across hosts.
+
+    Returns:
+        str: The host name, process id and a random suffix.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def write_json(path: str, data: Dict) -> None:
+    """
+    Writes a JSON file atomically, so that readers on other hosts never see a
+    partly written file.
+
+    Args:
+        path (str): The path to the file.
+        data (dict): The contents.
+
+    Returns:
+        None
+    """
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="UTF-8") as stream:
+        json.dump(data, stream)
+        stream.flush()
+        os.fsync(stream.fileno())
+    os.replace(temp_path, path)
+
+
+def read_json(path: str) -> Optional[Dict]:
+    """
+    Reads a JSON file written by write_json().
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        dict: The contents, or None if the file does not exist.
+    """
+    try:
+        with open(path, "r", encoding="UTF-8") as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return None
+
+
+def remove_file(path: str) -> None:
+    """
+    Removes a file if it exists.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        None
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Lease:
+    """
+    A worker's claim on a job, held by a lease file in the spool.
+
+    The lease expires unless its file is touched at least every lease_ttl
+    seconds, after which another worker may take the job over. While used as a
+    context manager, a heartbeat thread touches the file every third of the
+    lease_ttl, and the lease is released on exit.
+
+    Attributes:
+        path (str): The path to the lease file.
+        worker_id (str): The worker holding the lease.
+        lost (bool): Whether another worker has taken the job over.
+    """
+
+    def __init__(self, path: str, worker_id: str, lease_ttl: float):
+        self.path = path
+        self.worker_id = worker_id
+        self.lost = False
+        self._lease_ttl = lease_ttl
+        self._stopped = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def is_held(self) -> bool:
+        """
+        Checks the lease file still names this worker.
+
+        Returns:
+            bool: True if the lease is still held.
+        """
+        data = read_json(self.path)
+        return data is not None and data.get("worker") == self.worker_id
+
+    def renew(self) -> bool:
+        """
+        Extends the lease by touching its file.
+
+        Returns:
+            bool: True if the lease was renewed, False if it has been lost.
+        """
+        if self.lost or not self.is_held():
+            self.lost = True
+            return False
+
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            self.lost = True
+
+        return not self.lost
+
+    def _beat(self) -> None:
+        while not self._stopped.wait(self._lease_ttl / 3):
+            if not self.renew():
+                break
+
+    def release(self) -> None:
+        """
+        Stops the heartbeat and gives up the lease, if it is still held.
+
+        Returns:
+            None
+        """
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+        if not self.lost and self.is_held():
+            remove_file(self.path)
+        self.lost = True
+
+    def __enter__(self) -> "Lease":
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.release()
+
+
+class Spool:
+    """
+    A work queue of books kept in a directory shared by several hosts, such as
+    an NFS mount, needing no broker.
+
+    Jobs are JSON files in queue/. A worker claims a job by creating its lease
+    file in leases/ with link(), which is atomic even on NFS, and keeps the
+    lease alive with a heartbeat. The lease of a crashed worker expires and the
+    job is claimed again by another worker. Finished jobs are recorded in done/
+    and jobs that raised an error in failed/.
+
+    Lease ages are measured against the spool's own clock (the modification
+    time of a file touched on the shared filesystem), so clock differences
+    between hosts do not matter.
+
+    Attributes:
+        path (str): The spool directory.
+        worker_id (str): The name of this worker.
+        lease_ttl (float): The seconds a lease lasts without a heartbeat.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        worker_id: Optional[str] = None,
+        lease_ttl: float = LEASE_TTL,
+    ):
+        self.path = path
+        self.worker_id = worker_id or get_worker_id()
+        self.lease_ttl = lease_ttl
+
+        for directory in [
+            QUEUE_DIRECTORY,
+            LEASE_DIRECTORY,
+            DONE_DIRECTORY,
+            FAILED_DIRECTORY,
+        ]:
+            os.makedirs(os.path.join(path, directory), exist_ok=True)
+
+    def get_path(self, directory: str, job_id: str) -> str:
+        """
+        Gets the path of a job's file in one of the spool's directories.
+
+        Args:
+            directory (str): The spool directory, e.g. QUEUE_DIRECTORY.
+            job_id (str): The job.
+
+        Returns:
+            str: The path.
+        """
+        extension = "lease" if directory == LEASE_DIRECTORY else "json"
+        return os.path.join(self.path, directory, f"{job_id}.{extension}")
+
+    def get_job_ids(self, directory: str = QUEUE_DIRECTORY) -> List[str]:
+        """
+        Gets the jobs in one of the spool's directories.
+
+        Args:
+            directory (str, optional): The spool directory. Defaults to the
+                queue.
+
+        Returns:
+            List[str]: The job ids, in name order.
+        """
+        return sorted(
+            name[: -len(".json")]
+            for name in os.listdir(os.path.join(self.path, directory))
+            if name.endswith(".json")
+        )
+
+    def get_time(self) -> float:
+        """
+        Gets the current time by the clock of the spool's filesystem.
+
+        Returns:
+            float: The time, in seconds since the epoch.
+        """
+        clock_path = os.path.join(self.path, f".clock-{socket.gethostname()}")
+        with open(clock_path, "a", encoding="UTF-8"):
+            pass
+        os.utime(clock_path)
+
+        return os.stat(clock_path).st_mtime
+
+    def enqueue(
+        self, input_file: str, output_file: str, profile: Dict
+    ) -> Optional[str]:
+        """
+        Adds a book to the queue.
+
+        Books already queued or converted (with the same contents, output and
+        profile) are not added again. Books that failed are retried.
+
+        Args:
+            input_file (str): The path to the comic book archive, as seen by
+                every worker.
+            output_file (str): The path to write the epub to.
+            profile (dict): The conversion profile.
+
+        Returns:
+            str: The id of the new job, or None if the book was not added.
+        """
+        input_file = os.path.abspath(input_file)
+        output_file = os.path.abspath(output_file)
+        job_id = get_work_key(get_book_key(input_file, profile), output_file)
+
+        if os.path.exists(
+            self.get_path(QUEUE_DIRECTORY, job_id)
+        ) or os.path.exists(self.get_path(DONE_DIRECTORY, job_id)):
+            return None
+
+        remove_file(self.get_path(FAILED_DIRECTORY, job_id))
+        write_json(
+            self.get_path(QUEUE_DIRECTORY, job_id),
+            {
+                "id": job_id,
+                "input_file": input_file,
+                "output_file": output_file,
+                "profile": profile,
+            },
+        )
+
+        return job_id
+
+    def is_expired(self, lease_path: str) -> bool:
+        """
+        Checks whether a lease has gone without a heartbeat for too long.
+
+        Args:
+            lease_path (str): The path to the lease file.
+
+        Returns:
+            bool: True if the lease has expired.
+        """
+        try:
+            modified_time = os.stat(lease_path).st_mtime
+        except FileNotFoundError:
+            return True
+
+        return self.get_time() - modified_time > self.lease_ttl
+
+    def acquire(self, job_id: str) -> Optional[Lease]:
+        """
+        Tries to take the lease of a job, taking it over if it has expired.
+
+        Args:
+            job_id (str): The job.
+
+        Returns:
+            Lease: The lease, or None if another worker holds it.
+        """
+        lease_path = self.get_path(LEASE_DIRECTORY, job_id)
+        temp_path = f"{lease_path}.{self.worker_id}"
+        write_json(
+            temp_path, {"worker": self.worker_id, "time": self.get_time()}
+        )
+
+        try:
+            for _ in range(2):
+                try:
+                    os.link(temp_path, lease_path)
+                    return Lease(lease_path, self.worker_id, self.lease_ttl)
+                except FileExistsError:
+                    if not self.is_expired(lease_path) or not self._expire(
+                        lease_path
+                    ):
+                        return None
+            return None
+        finally:
+            remove_file(temp_path)
+
+    def _expire(self, lease_path: str) -> bool:
+        # Renaming is atomic, so only one worker takes over an expired lease
+        expired_path = f"{lease_path}.expired.{self.worker_id}"
+        try:
+            os.rename(lease_path, expired_path)
+        except FileNotFoundError:
+            return False
+
+        # The lease was renewed or replaced after it was checked, put it back
+        if not self.is_expired(expired_path):
+            try:
+                os.link(expired_path, lease_path)
+            except FileExistsError:
+                pass
+            remove_file(expired_path)
+            return False
+
+        remove_file(expired_path)
+        return True
+
+    def claim(self) -> Optional[Tuple[Dict, Lease]]:
+        """
+        Claims the first queued job that no other worker holds.
+
+        Returns:
+            Tuple[dict, Lease]: The job and its lease, or None if there is no
+                job to claim.
+        """
+        for job_id in self.get_job_ids():
+            if os.path.exists(self.get_path(DONE_DIRECTORY, job_id)):
+                # A worker stopped between recording and dequeuing the job
+                remove_file(self.get_path(QUEUE_DIRECTORY, job_id))
+                continue
+
+            lease = self.acquire(job_id)
+            if lease is None:
+                continue
+
+            job = read_json(self.get_path(QUEUE_DIRECTORY, job_id))
+            if job is None:
+                # Finished by its previous holder after the queue was listed
+                lease.release()
+                continue
+
+            return job, lease
+
+        return None
+
+    def finish(self, job: Dict, lease: Lease, directory: str, **data) -> bool:
+        """
+        Records the outcome of a job and removes it from the queue.
+
+        Args:
+            job (dict): The job.
+            lease (Lease): The job's lease.
+            directory (str): DONE_DIRECTORY or FAILED_DIRECTORY.
+            **data: Details of the outcome.
+
+        Returns:
+            bool: True if recorded, False if the lease was lost to another
+                worker, which then records the outcome instead.
+        """
+        if not lease.renew():
+            return False
+
+        write_json(
+            self.get_path(directory, job["id"]),
+            {**job, "worker": self.worker_id, **data},
+        )
+        remove_file(self.get_path(QUEUE_DIRECTORY, job["id"]))
+        lease.release()
+
+        return True
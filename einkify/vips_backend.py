@@ -0,0 +1,100 @@
+"""
+vips_backend.py
+author: slapelachie <slapelachie@gmail.com>
+"""
+from typing import Dict, Optional, Tuple
+
+try:
+    import pyvips
+except (ImportError, OSError):  # OSError when libvips itself is missing
+    pyvips = None
+
+from .image_backend import ImageBackend
+from .image_processor import IDENTITY_LUT, get_tone_lut
+
+
+class VipsBackend(ImageBackend):
+    """
+    An image backend using libvips.
+
+    libvips evaluates images on demand in small regions, spread over its own
+    threads, so only a strip of each page is held in memory at a time. JPEG
+    and WebP pages are decoded at a reduced size when they are going to be
+    shrunk anyway.
+
+    Raises:
+        ImportError: If pyvips or libvips is not installed.
+    """
+
+    name = "vips"
+
+    def __init__(self):
+        if pyvips is None:
+            raise ImportError(
+                "The vips backend requires pyvips and libvips, install them "
+                "with 'pip install einkify[vips]'"
+            )
+
+        # Every page is converted once, caching operations only costs memory
+        pyvips.cache_set_max(0)
+
+    def open(
+        self, data: bytes, max_size: Optional[Tuple[int, int]] = None
+    ) -> "pyvips.Image":
+        if max_size is None:
+            return pyvips.Image.new_from_buffer(data, "", access="sequential")
+
+        # Shrinks while decoding, rather than decoding then resizing
+        return pyvips.Image.thumbnail_buffer(
+            data, max_size[0], height=max_size[1], size="down"
+        )
+
+    def convert(self, image: "pyvips.Image", mono: bool) -> "pyvips.Image":
+        if not mono:
+            # Pages are saved with 8 bits per band
+            if image.format != "uchar":
+                image = image.colourspace("srgb")
+            return image
+
+        # Like Pillow, converting to grayscale discards the alpha band
+        if image.hasalpha():
+            image = image.extract_band(0, n=image.bands - 1)
+        return image.colourspace("b-w")
+
+    def resize(
+        self, image: "pyvips.Image", max_size: Tuple[int, int]
+    ) -> "pyvips.Image":
+        return image.thumbnail_image(
+            max_size[0], height=max_size[1], size="down"
+        )
+
+    def tone(self, image: "pyvips.Image", profile: Dict) -> "pyvips.Image":
+        histogram = None
+        if profile.get("autocontrast"):
+            gray = image.colourspace("b-w") if image.bands > 2 else image
+            histogram = [
+                int(count)
+                for count in gray.extract_band(0).hist_find().tolist()[0]
+            ]
+
+        lut = get_tone_lut(profile, histogram)
+        if lut == IDENTITY_LUT:
+            return image
+
+        # Colour bands share the table, alpha is left untouched
+        lut_image = pyvips.Image.new_from_list([list(lut)]).cast("uchar")
+        if image.hasalpha():
+            return (
+                image.extract_band(0, n=image.bands - 1)
+                .maplut(lut_image)
+                .bandjoin(image.extract_band(image.bands - 1))
+            )
+
+        return image.maplut(lut_image)
+
+    def encode(self, image: "pyvips.Image", image_type: str) -> bytes:
+        image_type = image_type.lower()
+        if image_type in ["jpg", "jpeg"] and image.hasalpha():
+            image = image.extract_band(0, n=image.bands - 1)
+
+        return image.write_to_buffer(f".{image_type}")
@@ -10,6 +10,9 @@ setup(
         "PyYAML>=6.0",
         "rarfile>=4.0",
     ],
+    extras_require={
+        "vips": ["pyvips>=2.2.0"],
+    },
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
         "Environment :: X11 Applications",
@@ -18,5 +21,10 @@ setup(
         "Operating System :: POSIX :: Linux",
         "Programming Language :: Python :: 3.10",
     ],
-    entry_points={"console_scripts": ["einkify=einkify.__main__:main"]},
+    entry_points={
+        "console_scripts": [
+            "einkify=einkify.__main__:main",
+            "einkify-server=einkify.server:main",
+        ]
+    },
 )
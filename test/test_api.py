@@ -0,0 +1,106 @@
+import asyncio
+import io
+import os
+import threading
+import unittest
+import zipfile
+from unittest import mock
+from PIL import Image
+from einkify import convert, convert_async, image_processor
+from einkify.error import VerifyFileError
+
+
+def make_cbz(page_count):
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as archive:
+        for index in range(page_count):
+            image_stream = io.BytesIO()
+            Image.new("RGB", (200, 300), color="red").save(
+                image_stream, format="PNG"
+            )
+            archive.writestr(
+                f"chapter 1/{index:03}.png", image_stream.getvalue()
+            )
+        archive.writestr("info.txt", "not an image")
+    return stream.getvalue()
+
+
+class TestConvert(unittest.TestCase):
+    def test_convert_bytes(self):
+        epub = convert(make_cbz(3), {"type": "jpg"}, title="Test")
+
+        with zipfile.ZipFile(io.BytesIO(epub)) as epub_file:
+            names = epub_file.namelist()
+            self.assertEqual(names[0], "mimetype")
+            self.assertEqual(
+                epub_file.getinfo("mimetype").compress_type, zipfile.ZIP_STORED
+            )
+            self.assertIn("OEBPS/Images/chapter-1-000.jpg", names)
+            self.assertIn("OEBPS/Text/chapter-1-002.xhtml", names)
+            self.assertNotIn("OEBPS/Images/info.txt", names)
+
+            content = epub_file.read("OEBPS/content.opf").decode()
+            self.assertIn("<dc:title>Test</dc:title>", content)
+            self.assertIn('media-type="image/jpeg"', content)
+
+    def test_convert_stream_to_stream(self):
+        cbz_file = os.path.join(os.path.dirname(__file__), "assets/test.cbz")
+        output = io.BytesIO()
+        with open(cbz_file, "rb") as source:
+            self.assertIsNone(convert(source, {"mono": True}, output))
+
+        with zipfile.ZipFile(output) as epub_file:
+            image = Image.open(
+                io.BytesIO(epub_file.read("OEBPS/Images/test.jpg"))
+            )
+            self.assertEqual(image.mode, "L")
+
+    def test_pipeline_disabled(self):
+        threads = []
+
+        def convert_image_data(profile, data):
+            threads.append(threading.current_thread())
+            return image_processor.encode_image(Image.new("L", (2, 3)), "jpg")
+
+        with mock.patch.object(
+            image_processor, "convert_image_data", convert_image_data
+        ):
+            epub = convert(make_cbz(3), {"pipeline": False})
+        self.assertEqual(set(threads), {threading.current_thread()})
+
+        with zipfile.ZipFile(io.BytesIO(epub)) as epub_file:
+            self.assertIn(
+                "OEBPS/Text/chapter-1-002.xhtml", epub_file.namelist()
+            )
+
+    def test_resize(self):
+        epub = convert(make_cbz(1), {"max_dimension": 50, "zoom_factor": 2})
+
+        with zipfile.ZipFile(io.BytesIO(epub)) as epub_file:
+            image = Image.open(
+                io.BytesIO(epub_file.read("OEBPS/Images/chapter-1-000.jpg"))
+            )
+            self.assertEqual(image.size, (67, 100))
+
+    def test_invalid_archive(self):
+        with self.assertRaises(VerifyFileError):
+            convert(b"not an archive")
+
+    def test_no_images(self):
+        stream = io.BytesIO()
+        with zipfile.ZipFile(stream, "w") as archive:
+            archive.writestr("info.txt", "not an image")
+
+        with self.assertRaises(VerifyFileError):
+            convert(stream.getvalue())
+
+    def test_convert_async(self):
+        epub = asyncio.run(convert_async(make_cbz(2)))
+        with zipfile.ZipFile(io.BytesIO(epub)) as epub_file:
+            self.assertIn(
+                "OEBPS/Text/chapter-1-001.xhtml", epub_file.namelist()
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
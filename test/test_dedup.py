@@ -0,0 +1,168 @@
+import functools
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from PIL import Image, ImageDraw
+from einkify import convert
+from einkify.dedup import (
+    find_similar_pages,
+    get_dhash,
+    hamming_distance,
+    skip_duplicates,
+)
+from einkify.ebook_generator import make_ebook
+from einkify.image_processor import (
+    convert_pages,
+    get_image_paths,
+    process_images,
+    read_images,
+)
+
+
+def make_page(text, noise=0):
+    image = Image.new("L", (300, 450), color=255 - noise)
+    draw = ImageDraw.Draw(image)
+    for index, character in enumerate(text):
+        offset = (ord(character) * 7) % 200
+        draw.rectangle(
+            [offset, index * 40, offset + 80, index * 40 + 30], fill=0
+        )
+    return image
+
+
+def encode(image, image_format="PNG"):
+    stream = io.BytesIO()
+    image.save(stream, format=image_format)
+    return stream.getvalue()
+
+
+class TestHashes(unittest.TestCase):
+    def test_dhash_similar(self):
+        first_hash = get_dhash(make_page("credits"))
+        second_hash = get_dhash(
+            Image.open(io.BytesIO(encode(make_page("credits", 3), "JPEG")))
+        )
+        self.assertLessEqual(hamming_distance(first_hash, second_hash), 4)
+
+    def test_dhash_different(self):
+        first_hash = get_dhash(make_page("credits"))
+        second_hash = get_dhash(make_page("story"))
+        self.assertGreater(hamming_distance(first_hash, second_hash), 4)
+
+    def test_dhash_blank_pages(self):
+        self.assertEqual(
+            get_dhash(Image.new("L", (300, 450), color=255)),
+            get_dhash(Image.new("L", (300, 450), color=254)),
+        )
+
+    def test_skip_duplicates(self):
+        duplicates = {}
+        images = [("1.png", b"a"), ("2.png", b"b"), ("3.png", b"a")]
+        self.assertEqual(list(skip_duplicates(images, duplicates)), images[:2])
+        self.assertEqual(duplicates, {"3.png": "1.png"})
+
+    def test_find_similar_pages(self):
+        images = [
+            ("1.png", encode(make_page("credits"))),
+            ("2.png", encode(make_page("story"))),
+            ("3.png", encode(make_page("credits", 2))),
+        ]
+        self.assertEqual(find_similar_pages(images, 4), ["3.png"])
+
+
+class TestDeduplicatedBook(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_directory = os.path.join(self.temp_dir, "book")
+        for chapter in ["1", "2"]:
+            os.makedirs(os.path.join(self.image_directory, chapter))
+            make_page("credits").save(
+                os.path.join(self.image_directory, chapter, "0.png")
+            )
+            make_page(f"story {chapter}").save(
+                os.path.join(self.image_directory, chapter, "1.png")
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_process_images_links_duplicates(self):
+        output_directory = process_images(
+            {"type": "png"}, self.image_directory
+        )
+        first = os.stat(os.path.join(output_directory, "1", "0.png"))
+        second = os.stat(os.path.join(output_directory, "2", "0.png"))
+        self.assertEqual(first.st_ino, second.st_ino)
+
+    def test_process_images_drops_similar_pages(self):
+        output_directory = process_images(
+            {"type": "jpg", "drop_similar_pages": True}, self.image_directory
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(output_directory, "1", "0.jpg"))
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(output_directory, "2", "0.jpg"))
+        )
+
+    def test_convert_pages_returns_duplicates(self):
+        duplicates = convert_pages(
+            {"type": "jpg"},
+            get_image_paths(self.image_directory),
+            functools.partial(read_images, self.image_directory),
+            os.path.join(self.temp_dir, "convert"),
+        )
+        self.assertEqual(duplicates, {"2/0.jpg": "1/0.jpg"})
+
+    def test_make_ebook_stores_duplicates_once(self):
+        output_directory = os.path.join(self.temp_dir, "convert")
+        duplicates = convert_pages(
+            {"type": "png"},
+            get_image_paths(self.image_directory),
+            functools.partial(read_images, self.image_directory),
+            output_directory,
+        )
+        epub_path = make_ebook(
+            "Book",
+            output_directory,
+            os.path.join(self.temp_dir, "Book.kepub.epub"),
+            duplicates=duplicates,
+        )
+
+        with zipfile.ZipFile(epub_path) as epub_file:
+            names = epub_file.namelist()
+            content = epub_file.read("OEBPS/content.opf").decode()
+            page = epub_file.read("OEBPS/Text/2-0.xhtml").decode()
+        self.assertIn("OEBPS/Text/2-0.xhtml", names)
+        self.assertNotIn("OEBPS/Images/2-0.png", names)
+        self.assertNotIn("Images/2-0.png", content)
+        self.assertIn('src="../Images/1-0.png"', page)
+
+    def test_convert_stores_duplicates_once(self):
+        stream = io.BytesIO()
+        with zipfile.ZipFile(stream, "w") as archive:
+            for root, _, files in os.walk(self.image_directory):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    archive.write(
+                        file_path,
+                        os.path.relpath(file_path, self.image_directory),
+                    )
+
+        epub = convert(stream.getvalue(), {"type": "png"})
+        with zipfile.ZipFile(io.BytesIO(epub)) as epub_file:
+            names = epub_file.namelist()
+            page = epub_file.read("OEBPS/Text/2-0.xhtml").decode()
+        self.assertEqual(
+            len([name for name in names if name.startswith("OEBPS/Text/")]),
+            5,
+        )
+        self.assertNotIn("OEBPS/Images/2-0.png", names)
+        self.assertIn('src="../Images/1-0.png"', page)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,360 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from unittest import mock
+from xml.etree import ElementTree
+from PIL import Image
+from einkify.api import convert
+from einkify.ebook_generator import (
+    create_epub,
+    create_nav,
+    create_toc,
+    get_chapters,
+    get_part_path,
+    make_ebooks,
+    split_pages,
+)
+
+
+def get_manifest_items(epub_file):
+    content = ElementTree.fromstring(epub_file.read("OEBPS/content.opf"))
+    return [
+        element.attrib
+        for element in content.iter()
+        if element.tag.endswith("}item")
+    ]
+
+
+class TestSplitPages(unittest.TestCase):
+    def setUp(self):
+        self.image_paths = [
+            "a/1.jpg",
+            "a/2.jpg",
+            "a/3.jpg",
+            "b/1.jpg",
+            "b/2.jpg",
+            "c/1.jpg",
+        ]
+        self.image_sizes = {image_path: 10 for image_path in self.image_paths}
+
+    def test_no_limits(self):
+        self.assertEqual(
+            split_pages(self.image_paths, self.image_sizes),
+            [self.image_paths],
+        )
+
+    def test_max_pages(self):
+        parts = split_pages(self.image_paths, self.image_sizes, max_pages=4)
+        self.assertEqual([len(part) for part in parts], [4, 2])
+
+    def test_max_bytes(self):
+        parts = split_pages(self.image_paths, self.image_sizes, max_bytes=25)
+        self.assertEqual([len(part) for part in parts], [2, 2, 2])
+
+    def test_oversized_page_gets_own_part(self):
+        self.image_sizes["a/2.jpg"] = 100
+        parts = split_pages(self.image_paths, self.image_sizes, max_bytes=25)
+        self.assertEqual(parts[1], ["a/2.jpg"])
+
+    def test_by_chapter(self):
+        parts = split_pages(
+            self.image_paths, self.image_sizes, by_chapter=True
+        )
+        self.assertEqual(
+            parts,
+            [
+                self.image_paths[:3],
+                self.image_paths[3:5],
+                self.image_paths[5:],
+            ],
+        )
+
+    def test_by_chapter_with_limit(self):
+        parts = split_pages(
+            self.image_paths, self.image_sizes, max_pages=3, by_chapter=True
+        )
+        self.assertEqual(parts, [self.image_paths[:3], self.image_paths[3:]])
+
+    def test_by_chapter_splits_oversized_chapter(self):
+        parts = split_pages(
+            self.image_paths, self.image_sizes, max_pages=2, by_chapter=True
+        )
+        self.assertEqual(
+            parts,
+            [
+                ["a/1.jpg", "a/2.jpg"],
+                ["a/3.jpg"],
+                ["b/1.jpg", "b/2.jpg"],
+                ["c/1.jpg"],
+            ],
+        )
+
+    def test_by_chapter_in_root_folder(self):
+        image_paths = [
+            f"Vol 1/{image_path}" for image_path in self.image_paths
+        ]
+        image_sizes = {image_path: 10 for image_path in image_paths}
+        parts = split_pages(image_paths, image_sizes, by_chapter=True)
+        self.assertEqual(
+            parts, [image_paths[:3], image_paths[3:5], image_paths[5:]]
+        )
+
+
+class TestGetPartPath(unittest.TestCase):
+    def test_default_output(self):
+        self.assertEqual(
+            get_part_path("Book", None, 1, 3), "Book - Part 01.kepub.epub"
+        )
+
+    def test_output_path(self):
+        self.assertEqual(
+            get_part_path("Book", "out/book.epub", 12, 150),
+            "out/book - Part 012.epub",
+        )
+
+
+class TestChapters(unittest.TestCase):
+    def test_single_entry_without_chapters(self):
+        toc = "".join(create_toc("Book", "uuid", "1.xhtml"))
+        self.assertEqual(toc.count("<navPoint"), 1)
+        self.assertIn("<text>Book</text></navLabel>", toc)
+
+    def test_chapter_entries(self):
+        chapters = [("a", "a-1.xhtml"), ("b", "b-1.xhtml")]
+        toc = "".join(create_toc("Book", "uuid", "a-1.xhtml", chapters))
+        nav = "".join(create_nav("Book", "a-1.xhtml", chapters))
+        self.assertEqual(toc.count("<navPoint"), 2)
+        self.assertIn('<a href="Text/b-1.xhtml">b</a>', nav)
+
+    def test_chapters_in_root_folder(self):
+        image_paths = [
+            "Vol 1/cover.jpg",
+            "Vol 1/Ch 001/001.jpg",
+            "Vol 1/Ch 001/002.jpg",
+            "Vol 1/Ch 002/001.jpg",
+        ]
+        xhtml_paths = [f"Text/{index}.xhtml" for index in range(4)]
+        self.assertEqual(
+            get_chapters(image_paths, xhtml_paths),
+            [("", "0.xhtml"), ("Ch 001", "1.xhtml"), ("Ch 002", "3.xhtml")],
+        )
+
+    def test_single_folder_without_chapters(self):
+        self.assertEqual(
+            get_chapters(["Vol 1/001.jpg", "Vol 1/002.jpg"], ["1", "2"]), []
+        )
+
+    def test_cover_is_first_page(self):
+        stream = io.BytesIO()
+        with zipfile.ZipFile(stream, "w") as archive:
+            for index in range(3):
+                image_stream = io.BytesIO()
+                Image.new("RGB", (20, 30), color=(index * 100, 0, 0)).save(
+                    image_stream, "PNG"
+                )
+                archive.writestr(f"{index}.png", image_stream.getvalue())
+
+        with zipfile.ZipFile(
+            io.BytesIO(convert(stream.getvalue()))
+        ) as epub_file:
+            names = epub_file.namelist()
+            items = get_manifest_items(epub_file)
+
+        self.assertEqual(
+            [name for name in names if name.startswith("OEBPS/Images/")],
+            ["OEBPS/Images/0.jpg", "OEBPS/Images/1.jpg", "OEBPS/Images/2.jpg"],
+        )
+        cover = [item for item in items if item["id"] == "cover"]
+        self.assertEqual(len(cover), 1)
+        self.assertEqual(cover[0]["href"], "Images/0.jpg")
+        hrefs = [item["href"] for item in items]
+        self.assertEqual(len(hrefs), len(set(hrefs)))
+
+    def test_labels_escaped(self):
+        stream = io.BytesIO()
+        with zipfile.ZipFile(stream, "w") as archive:
+            for image_path in [
+                "0.png",
+                "Ch 1 & 2/1.png",
+                "Ch 3 <extra>/1.png",
+            ]:
+                image_stream = io.BytesIO()
+                Image.new("RGB", (20, 30)).save(image_stream, "PNG")
+                archive.writestr(image_path, image_stream.getvalue())
+
+        epub = convert(stream.getvalue(), title="Tom & Jerry")
+        with zipfile.ZipFile(io.BytesIO(epub)) as epub_file:
+            toc = ElementTree.fromstring(epub_file.read("OEBPS/toc.ncx"))
+            nav = ElementTree.fromstring(epub_file.read("OEBPS/nav.xhtml"))
+            ElementTree.fromstring(epub_file.read("OEBPS/content.opf"))
+
+        self.assertEqual(
+            [
+                element.text
+                for element in toc.iter()
+                if element.tag.endswith("text")
+            ],
+            ["Tom & Jerry", "Tom & Jerry", "Ch 1 & 2", "Ch 3 <extra>"],
+        )
+        self.assertEqual(
+            [
+                element.text
+                for element in nav.iter()
+                if element.tag.endswith("}a")
+            ],
+            ["Tom & Jerry", "Ch 1 & 2", "Ch 3 <extra>", "Tom & Jerry"],
+        )
+
+
+class TestMakeEbooks(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_directory = os.path.join(self.temp_dir, "convert")
+        for chapter in ["Chapter 1", "Chapter 2"]:
+            os.makedirs(os.path.join(self.image_directory, chapter))
+            for index in range(2):
+                Image.new("RGB", (100, 150), color="red").save(
+                    os.path.join(
+                        self.image_directory, chapter, f"{index}.jpg"
+                    ),
+                    format="JPEG",
+                )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_single_part(self):
+        output_path = os.path.join(self.temp_dir, "Book.kepub.epub")
+        self.assertEqual(
+            make_ebooks("Book", self.image_directory, output_path),
+            [output_path],
+        )
+
+    def test_split_by_chapter(self):
+        output_path = os.path.join(self.temp_dir, "Book.kepub.epub")
+        epub_paths = make_ebooks(
+            "Book", self.image_directory, output_path, by_chapter=True
+        )
+        self.assertEqual(
+            [os.path.basename(epub_path) for epub_path in epub_paths],
+            ["Book - Part 01.kepub.epub", "Book - Part 02.kepub.epub"],
+        )
+
+        with zipfile.ZipFile(epub_paths[1]) as epub_file:
+            names = epub_file.namelist()
+            toc = epub_file.read("OEBPS/toc.ncx").decode()
+        self.assertIn("OEBPS/Text/Chapter-2-0.xhtml", names)
+        self.assertNotIn("OEBPS/Text/Chapter-1-0.xhtml", names)
+        self.assertIn("<text>Book - Part 02</text>", toc)
+        self.assertIn('src="Text/Chapter-2-0.xhtml"', toc)
+
+    def test_cover_is_first_page(self):
+        output_path = os.path.join(self.temp_dir, "Book.kepub.epub")
+        duplicates = {
+            "Chapter 1/1.jpg": "Chapter 1/0.jpg",
+            "Chapter 2/0.jpg": "Chapter 1/0.jpg",
+            "Chapter 2/1.jpg": "Chapter 1/0.jpg",
+        }
+        for epub_path in make_ebooks(
+            "Book",
+            self.image_directory,
+            output_path,
+            by_chapter=True,
+            duplicates=duplicates,
+        ):
+            with zipfile.ZipFile(epub_path) as epub_file:
+                names = epub_file.namelist()
+                items = get_manifest_items(epub_file)
+
+            # Every page is identical, so the first page's image is the only
+            # one stored, and it is the cover
+            self.assertEqual(
+                [name for name in names if name.startswith("OEBPS/Images/")],
+                [f"OEBPS/{cover['href']}" for cover in items[-1:]],
+            )
+            self.assertEqual(items[-1]["id"], "cover")
+            self.assertEqual(items[-1]["properties"], "cover-image")
+            hrefs = [item["href"] for item in items]
+            self.assertEqual(len(hrefs), len(set(hrefs)))
+
+
+class TestCreateEpub(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_concurrent_writers(self):
+        output_path = os.path.join(self.temp_dir, "book.kepub.epub")
+        epub_directories = []
+        for writer in range(2):
+            epub_directory = os.path.join(self.temp_dir, f"writer{writer}")
+            os.makedirs(epub_directory)
+            for index in range(50):
+                with open(
+                    os.path.join(epub_directory, f"{index}.xhtml"), "wb"
+                ) as stream:
+                    stream.write(bytes([writer]) * 20000)
+            epub_directories.append(epub_directory)
+
+        errors = []
+
+        def write(epub_directory):
+            try:
+                create_epub("Book", epub_directory, output_path)
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+
+        threads = [
+            threading.Thread(target=write, args=(epub_directory,))
+            for epub_directory in epub_directories
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.temp_dir).count("book.kepub.epub"), 1)
+        self.assertFalse(
+            [
+                name
+                for name in os.listdir(self.temp_dir)
+                if name.endswith(".tmp")
+            ]
+        )
+        with zipfile.ZipFile(output_path) as epub_file:
+            self.assertIsNone(epub_file.testzip())
+            contents = {
+                epub_file.read(name)[:1] for name in epub_file.namelist()
+            }
+        # Every member comes from the same writer
+        self.assertEqual(len(contents), 1)
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        epub_directory = os.path.join(self.temp_dir, "ebook")
+        os.makedirs(epub_directory)
+        with open(os.path.join(epub_directory, "mimetype"), "w") as stream:
+            stream.write("application/epub+zip")
+        output_directory = os.path.join(self.temp_dir, "output")
+        os.makedirs(output_directory)
+
+        with mock.patch.object(
+            zipfile.ZipFile, "write", side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                create_epub(
+                    "Book",
+                    epub_directory,
+                    os.path.join(output_directory, "book.kepub.epub"),
+                )
+        self.assertEqual(os.listdir(output_directory), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import unittest
+from PIL import Image
+from einkify.image_backend import ImageBackend
+from einkify.image_processor import (
+    PillowBackend,
+    convert_image,
+    convert_image_data,
+    encode_image,
+    get_backend,
+)
+
+try:
+    from einkify.vips_backend import pyvips
+except ImportError:
+    pyvips = None
+
+
+def encode_page(mode="RGB", size=(400, 600), color=(120, 130, 140)):
+    stream = io.BytesIO()
+    Image.new(mode, size, color=color).save(stream, "PNG")
+    return stream.getvalue()
+
+
+class TestGetBackend(unittest.TestCase):
+    def test_default_is_pillow(self):
+        self.assertIsInstance(get_backend(), PillowBackend)
+        self.assertIs(get_backend("pillow"), get_backend("pillow"))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_backend("imagemagick")
+
+    def test_interface_is_abstract(self):
+        class IncompleteBackend(ImageBackend):
+            def open(self, data, max_size=None):
+                return data
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+
+class TestPillowBackend(unittest.TestCase):
+    def test_matches_convert_image(self):
+        profile = {"mono": True, "max_dimension": 100, "gamma": 0.8}
+        data = encode_page()
+
+        expected = encode_image(
+            convert_image(Image.open(io.BytesIO(data)), profile), "jpg"
+        )
+        self.assertEqual(convert_image_data(profile, data), expected)
+
+    def test_size_after_resize(self):
+        backend = PillowBackend()
+        image = backend.resize(backend.open(encode_page()), (100, 100))
+        self.assertEqual(image.size, (67, 100))
+
+
+@unittest.skipIf(pyvips is None, "pyvips is not installed")
+class TestVipsBackend(unittest.TestCase):
+    def test_convert(self):
+        profile = {
+            "backend": "vips",
+            "mono": True,
+            "type": "png",
+            "max_dimension": 100,
+            "zoom_factor": 1,
+            "white_point": 130,
+        }
+        converted = Image.open(
+            io.BytesIO(convert_image_data(profile, encode_page()))
+        )
+        self.assertEqual(converted.mode, "L")
+        self.assertEqual(converted.size, (67, 100))
+        self.assertEqual(converted.getpixel((10, 10)), 255)
+
+    def test_alpha_untouched_by_tone(self):
+        backend = get_backend("vips")
+        image = backend.open(encode_page("RGBA", color=(100, 100, 100, 50)))
+        image = backend.tone(image, {"black_point": 100})
+        self.assertEqual(image(0, 0), [0, 0, 0, 50])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from PIL import Image
+from einkify.image_processor import (
+    convert_pages,
+    get_image_paths,
+    process_images,
+    read_images,
+)
+from einkify.journal import (
+    Journal,
+    WorkDirectory,
+    clean_work_directories,
+    get_book_key,
+)
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "journal.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_record_and_reload(self):
+        journal = Journal(self.path)
+        journal.record("page", path="1.jpg")
+        journal.record("extracted")
+
+        reloaded = Journal(self.path)
+        self.assertEqual(
+            reloaded.events("page"), [{"event": "page", "path": "1.jpg"}]
+        )
+        self.assertEqual(len(reloaded.events("extracted")), 1)
+
+    def test_partial_last_line_ignored(self):
+        Journal(self.path).record("page", path="1.jpg")
+        with open(self.path, "a", encoding="UTF-8") as stream:
+            stream.write('{"event": "pa')
+
+        self.assertEqual(len(Journal(self.path).entries), 1)
+
+
+class TestWorkDirectory(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_locked_while_in_use(self):
+        work_directory = WorkDirectory(self.temp_dir, "book")
+        with self.assertRaises(RuntimeError):
+            WorkDirectory(self.temp_dir, "book")
+
+        self.assertEqual(clean_work_directories(self.temp_dir), [])
+        work_directory.release()
+        self.assertEqual(
+            clean_work_directories(self.temp_dir),
+            [os.path.join(self.temp_dir, "book")],
+        )
+        self.assertFalse(os.path.exists(work_directory.path))
+
+    def test_book_key_changes_with_profile(self):
+        input_file = os.path.join(self.temp_dir, "book.cbz")
+        with open(input_file, "wb") as stream:
+            stream.write(b"archive")
+
+        self.assertEqual(
+            get_book_key(input_file, {"mono": True}),
+            get_book_key(input_file, {"mono": True}),
+        )
+        self.assertNotEqual(
+            get_book_key(input_file, {"mono": True}),
+            get_book_key(input_file, {"mono": False}),
+        )
+        # Rerunning with fewer workers (e.g. after running out of memory)
+        # resumes the same work
+        self.assertEqual(
+            get_book_key(input_file, {"mono": True, "workers": 8}),
+            get_book_key(
+                input_file, {"mono": True, "workers": 2, "pipeline": False}
+            ),
+        )
+
+
+class TestResumeProcessImages(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_directory = os.path.join(self.temp_dir, "book")
+        os.makedirs(self.image_directory)
+        for index in range(4):
+            Image.new("RGB", (50, 50), color=(index, 0, 0)).save(
+                os.path.join(self.image_directory, f"{index}.png")
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_resumes_from_completed_pages(self):
+        profile = {"type": "png"}
+        work_directory = WorkDirectory(self.temp_dir, "work")
+        output_directory = process_images(
+            profile, self.image_directory, work_directory
+        )
+        self.assertEqual(
+            work_directory.completed_pages,
+            {"0.png", "1.png", "2.png", "3.png"},
+        )
+        work_directory.release()
+
+        # Simulate a crash after the first two pages were converted
+        os.remove(os.path.join(output_directory, "2.png"))
+        os.remove(os.path.join(output_directory, "3.png"))
+        with open(
+            work_directory.journal.path, "w", encoding="UTF-8"
+        ) as stream:
+            stream.write('{"event": "page", "path": "0.png"}\n')
+            stream.write('{"event": "page", "path": "1.png"}\n')
+        completed_mtime = os.stat(
+            os.path.join(output_directory, "0.png")
+        ).st_mtime_ns
+
+        work_directory = WorkDirectory(self.temp_dir, "work")
+        process_images(profile, self.image_directory, work_directory)
+        work_directory.release()
+
+        self.assertEqual(
+            os.stat(os.path.join(output_directory, "0.png")).st_mtime_ns,
+            completed_mtime,
+        )
+        self.assertEqual(
+            sorted(os.listdir(output_directory)),
+            ["0.png", "1.png", "2.png", "3.png"],
+        )
+
+    def test_resume_keeps_duplicates(self):
+        shutil.copy(
+            os.path.join(self.image_directory, "0.png"),
+            os.path.join(self.image_directory, "4.png"),
+        )
+        image_paths = get_image_paths(self.image_directory)
+        read_pages = functools.partial(read_images, self.image_directory)
+        output_directory = os.path.join(self.temp_dir, "convert")
+
+        for _ in range(2):
+            work_directory = WorkDirectory(self.temp_dir, "work")
+            duplicates = convert_pages(
+                {"type": "png"},
+                image_paths,
+                read_pages,
+                output_directory,
+                work_directory,
+            )
+            work_directory.release()
+            self.assertEqual(duplicates, {"4.png": "0.png"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
 import sys
 import os
+import shutil
+import tempfile
 import unittest
+from einkify.__main__ import get_output_files
 
 
 class EInkifyTests(unittest.TestCase):
@@ -9,3 +12,26 @@ class EInkifyTests(unittest.TestCase):
         # from einkify.__main__ import verify_file
 
         # self.assertTrue(verify_file("test.cbz"))
+
+
+class TestGetOutputFiles(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_batch_outputs_in_directory(self):
+        self.assertEqual(
+            get_output_files(self.temp_dir, ["a/one.cbz", "b/two.cbz"]),
+            [
+                os.path.join(self.temp_dir, "one.kepub.epub"),
+                os.path.join(self.temp_dir, "two.kepub.epub"),
+            ],
+        )
+
+    def test_same_name_collides(self):
+        with self.assertRaises(ValueError):
+            get_output_files(self.temp_dir, ["a/book.cbz", "b/book.cbz"])
+        with self.assertRaises(ValueError):
+            get_output_files(None, ["a/book.cbz", "b/book.cbz"])
@@ -0,0 +1,130 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from PIL import Image
+from einkify.archive_extractor import (
+    MappedZipArchive,
+    get_stored_member,
+    read_archive_images,
+)
+from einkify.error import VerifyFileError
+from einkify.image_processor import BufferReader, open_image
+
+
+def encode_page(color):
+    stream = io.BytesIO()
+    Image.new("RGB", (40, 60), color=color).save(stream, "PNG")
+    return stream.getvalue()
+
+
+class TestMappedZipArchive(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.temp_dir, "book.cbz")
+        self.pages = {
+            "1.png": encode_page((255, 0, 0)),
+            "2.png": encode_page((0, 255, 0)),
+        }
+        with zipfile.ZipFile(self.input_file, "w") as archive:
+            archive.writestr("1.png", self.pages["1.png"], zipfile.ZIP_STORED)
+            info = zipfile.ZipInfo("2.png")
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, self.pages["2.png"])
+            archive.writestr("notes.txt", b"not a page")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_stored_members_are_views(self):
+        with MappedZipArchive(self.input_file) as archive:
+            self.assertEqual(archive.image_paths, ["1.png", "2.png"])
+            stored = archive.read("1.png")
+            deflated = archive.read("2.png")
+
+            self.assertIsInstance(stored, memoryview)
+            self.assertEqual(bytes(stored), self.pages["1.png"])
+            self.assertIsInstance(deflated, bytes)
+            self.assertEqual(deflated, self.pages["2.png"])
+            self.assertEqual(open_image(stored).getpixel((0, 0)), (255, 0, 0))
+
+    def test_views_outlive_archive(self):
+        with MappedZipArchive(self.input_file) as archive:
+            stored = archive.read("1.png")
+        self.assertEqual(bytes(stored), self.pages["1.png"])
+
+    def test_local_extra_field(self):
+        with open(self.input_file, "rb") as stream:
+            data = bytearray(stream.read())
+        with zipfile.ZipFile(self.input_file) as archive:
+            info = archive.getinfo("1.png")
+        # Grow the local extra field, shifting every later offset
+        extra = b"\xfe\xca\x04\x00abcd"
+        offset = info.header_offset
+        name_end = offset + 30 + len(info.filename.encode())
+        data[offset + 28 : offset + 30] = len(extra).to_bytes(2, "little")
+        data[name_end:name_end] = extra
+        shifted = zipfile.ZipInfo("1.png")
+        shifted.header_offset = offset
+        shifted.compress_size = info.compress_size
+        shifted.CRC = info.CRC
+
+        self.assertEqual(
+            bytes(get_stored_member(memoryview(bytes(data)), shifted)),
+            self.pages["1.png"],
+        )
+
+    def test_corrupt_member(self):
+        with zipfile.ZipFile(self.input_file) as archive:
+            info = archive.getinfo("1.png")
+        with open(self.input_file, "r+b") as stream:
+            # Flip a byte in the middle of the stored page
+            stream.seek(
+                info.header_offset
+                + 30
+                + len("1.png")
+                + info.compress_size // 2
+            )
+            byte = stream.read(1)
+            stream.seek(-1, io.SEEK_CUR)
+            stream.write(bytes([byte[0] ^ 0xFF]))
+
+        with MappedZipArchive(self.input_file) as archive:
+            with self.assertRaises(VerifyFileError):
+                archive.read("1.png")
+
+    def test_read_archive_images_from_bytes(self):
+        with open(self.input_file, "rb") as stream:
+            images = dict(read_archive_images(stream.read()))
+
+        self.assertIsInstance(images["1.png"], memoryview)
+        self.assertEqual(
+            {path: bytes(data) for path, data in images.items()}, self.pages
+        )
+
+
+class TestBufferReader(unittest.TestCase):
+    def test_read_and_seek(self):
+        reader = BufferReader(memoryview(b"0123456789"))
+        self.assertEqual(reader.read(3), b"012")
+        self.assertEqual(reader.seek(-2, io.SEEK_END), 8)
+        self.assertEqual(reader.read(), b"89")
+        self.assertEqual(reader.read(5), b"")
+        reader.seek(1)
+        target = bytearray(2)
+        self.assertEqual(reader.readinto(target), 2)
+        self.assertEqual(target, b"12")
+        reader.seek(9)
+        target = bytearray(4)
+        self.assertEqual(reader.readinto(target), 1)
+        self.assertEqual(target, b"9\0\0\0")
+        reader.seek(20)
+        self.assertEqual(reader.readinto(target), 0)
+        with self.assertRaises(ValueError):
+            reader.seek(-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from PIL import Image
+from einkify.image_processor import process_images
+from einkify.pipeline import run_pipeline
+
+
+class TestRunPipeline(unittest.TestCase):
+    def test_all_items_processed(self):
+        source = [(f"{index}.jpg", bytes([index])) for index in range(50)]
+        results = {}
+
+        def sink(index, path, result):
+            results[index] = (path, result)
+
+        run_pipeline(source, lambda _, data: data * 2, sink, workers=4)
+
+        self.assertEqual(len(results), 50)
+        self.assertEqual(results[7], ("7.jpg", bytes([7, 7])))
+
+    def test_empty_source(self):
+        results = []
+        run_pipeline(
+            [], lambda _, data: data, lambda *item: results.append(item)
+        )
+        self.assertEqual(results, [])
+
+    def test_read_ahead_is_bounded(self):
+        read_count = 0
+        release = threading.Event()
+
+        def source():
+            nonlocal read_count
+            for index in range(100):
+                read_count += 1
+                yield str(index), b""
+
+        def sink(index, path, result):
+            release.wait()
+
+        thread = threading.Thread(
+            target=run_pipeline,
+            args=(source(), lambda _, data: data, sink),
+            kwargs={"workers": 2, "queue_size": 2},
+        )
+        thread.start()
+        release.wait(0.5)
+        # One item in the sink, two queues of two and one item per worker,
+        # plus the one the reader is blocked on
+        self.assertLessEqual(read_count, 8)
+        release.set()
+        thread.join()
+        self.assertEqual(read_count, 100)
+
+    def test_transform_error(self):
+        def transform(path, data):
+            if path == "3":
+                raise ValueError("bad page")
+            return data
+
+        source = [(str(index), b"") for index in range(10)]
+        with self.assertRaises(ValueError):
+            run_pipeline(source, transform, lambda *_: None, workers=2)
+
+    def test_source_error(self):
+        def source():
+            yield "0", b""
+            raise OSError("bad archive")
+
+        with self.assertRaises(OSError):
+            run_pipeline(source(), lambda _, data: data, lambda *_: None)
+
+    def test_sink_error(self):
+        def sink(index, path, result):
+            raise OSError("disk full")
+
+        source = [(str(index), b"") for index in range(100)]
+        with self.assertRaises(OSError):
+            run_pipeline(source, lambda _, data: data, sink, queue_size=1)
+
+
+class TestProcessImages(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_directory = os.path.join(self.temp_dir, "book")
+        os.makedirs(os.path.join(self.image_directory, "chapter"))
+        for index in range(5):
+            Image.new("RGB", (100, 200), color="blue").save(
+                os.path.join(self.image_directory, "chapter", f"{index}.png")
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_pipeline_matches_sequential(self):
+        profile = {"type": "png", "mono": True, "max_dimension": 50}
+
+        output_directory = process_images(
+            dict(profile, pipeline=False), self.image_directory
+        )
+        sequential = sorted(
+            os.listdir(os.path.join(output_directory, "chapter"))
+        )
+        shutil.rmtree(output_directory)
+
+        output_directory = process_images(
+            dict(profile, workers=3), self.image_directory
+        )
+        pipelined = sorted(
+            os.listdir(os.path.join(output_directory, "chapter"))
+        )
+
+        self.assertEqual(sequential, pipelined)
+        self.assertEqual(len(pipelined), 5)
+        image = Image.open(os.path.join(output_directory, "chapter", "0.png"))
+        self.assertEqual(image.mode, "L")
+        self.assertEqual(image.size, (50, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+from einkify import scratch
+from einkify.archive_extractor import get_uncompressed_size
+from einkify.error import ScratchSpaceError
+from einkify.journal import get_book_key
+from einkify.scratch import (
+    SCRATCH_PREFIX,
+    check_free_space,
+    exit_on_signals,
+    get_scratch_root,
+    scratch_directory,
+)
+
+
+class TestScratch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.temp_dir, "book.cbz")
+        with zipfile.ZipFile(
+            self.input_file, "w", zipfile.ZIP_DEFLATED
+        ) as archive:
+            archive.writestr("1.png", b"\0" * 1000)
+            archive.writestr("2.png", b"\0" * 500)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_uncompressed_size(self):
+        self.assertEqual(get_uncompressed_size(self.input_file), 1500)
+
+    def test_workdir_wins(self):
+        workdir = os.path.join(self.temp_dir, "work")
+        self.assertEqual(get_scratch_root(1, workdir, 512), workdir)
+        self.assertTrue(os.path.isdir(workdir))
+
+    def test_prefers_memory_within_budget(self):
+        with mock.patch.object(scratch, "fits_in_memory", return_value=True):
+            self.assertEqual(
+                get_scratch_root(1, None, 512), scratch.RAM_DIRECTORY
+            )
+        self.assertEqual(get_scratch_root(1, None, 0), tempfile.gettempdir())
+
+    def test_not_enough_space(self):
+        with self.assertRaises(ScratchSpaceError):
+            check_free_space(
+                self.temp_dir, shutil.disk_usage(self.temp_dir).free + 1
+            )
+
+    def test_cleaned_up_on_failure(self):
+        with self.assertRaises(RuntimeError):
+            with scratch_directory(self.input_file, self.temp_dir) as path:
+                self.assertTrue(
+                    os.path.basename(path).startswith(SCRATCH_PREFIX)
+                )
+                raise RuntimeError("conversion failed")
+        self.assertFalse(os.path.exists(path))
+
+    def test_cleaned_up_on_signal(self):
+        with self.assertRaises(SystemExit):
+            with exit_on_signals():
+                with scratch_directory(self.input_file, self.temp_dir) as path:
+                    os.kill(os.getpid(), signal.SIGTERM)
+        self.assertFalse(os.path.exists(path))
+        self.assertIs(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+
+    def test_book_key_ignores_scratch_options(self):
+        self.assertEqual(
+            get_book_key(self.input_file, {"mono": True, "workdir": None}),
+            get_book_key(
+                self.input_file, {"mono": True, "workdir": "/scratch"}
+            ),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
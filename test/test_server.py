@@ -0,0 +1,196 @@
+import io
+import json
+import threading
+import time
+import unittest
+import zipfile
+from concurrent.futures import Future
+from http.client import HTTPConnection
+from PIL import Image
+from einkify.error import ServerBusyError
+from einkify.profile_processor import get_profile
+from einkify.server import ConversionService, create_server
+
+
+def make_cbz():
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as archive:
+        image_stream = io.BytesIO()
+        Image.new("RGB", (200, 300), color="red").save(
+            image_stream, format="PNG"
+        )
+        archive.writestr("001.png", image_stream.getvalue())
+    return stream.getvalue()
+
+
+class TestConversionService(unittest.TestCase):
+    def setUp(self):
+        self.service = ConversionService(
+            get_profile(), workers=1, max_upload_size=1000, max_memory=1500
+        )
+
+    def tearDown(self):
+        self.service.shutdown()
+
+    def test_upload_too_large(self):
+        with self.assertRaises(ValueError):
+            self.service.reserve(1001)
+
+    def test_memory_exhausted(self):
+        self.service.submit(b"x" * 1000)
+        with self.assertRaises(ServerBusyError):
+            self.service.reserve(1000)
+
+    def test_too_many_jobs(self):
+        self.service.max_jobs = 0
+        with self.assertRaises(ServerBusyError):
+            self.service.submit(b"x")
+
+    def test_failed_job_releases_memory(self):
+        job = self.service.submit(b"x" * 1000)
+        for _ in range(100):
+            if job.status != "pending":
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.service.get(job.job_id).status, "failed")
+        self.service.reserve(1000)
+
+    def test_single_conversion_thread_per_process(self):
+        self.assertEqual(self.service.profile["workers"], 1)
+
+    def test_reservation_holds_capacity(self):
+        reservation = self.service.reserve(1000)
+        with self.assertRaises(ServerBusyError):
+            self.service.reserve(1000)
+        self.service.release(reservation)
+        self.service.reserve(1000)
+
+    def test_negative_upload_size(self):
+        with self.assertRaises(ValueError):
+            self.service.reserve(-1)
+
+    def test_upload_larger_than_reservation(self):
+        reservation = self.service.reserve(10)
+        with self.assertRaises(ValueError):
+            self.service.submit(b"x" * 11, reservation=reservation)
+
+    def test_broken_pool_replaced(self):
+        # pylint: disable=protected-access
+        self.service.max_upload_size = self.service.max_memory = 10**6
+        for process in list(self.service._executor._processes.values()):
+            process.kill()
+        for _ in range(100):
+            if self.service._executor._broken:
+                break
+            time.sleep(0.1)
+
+        job = self.service.submit(make_cbz())
+        for _ in range(100):
+            if job.status != "pending":
+                break
+            time.sleep(0.1)
+        self.assertEqual(job.status, "done")
+
+    def remove_in_thread(self, job_id):
+        thread = threading.Thread(
+            target=self.service.remove, args=(job_id,), daemon=True
+        )
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+    def test_remove_pending_job(self):
+        future = Future()
+        # pylint: disable=protected-access
+        self.service._submit_conversion = lambda data, title: future
+        job = self.service.submit(b"x" * 1000)
+
+        self.remove_in_thread(job.job_id)
+        self.assertTrue(future.cancelled())
+        self.assertIsNone(self.service.get(job.job_id))
+        self.service.reserve(1000)
+
+    def test_remove_running_job_holds_capacity(self):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        # pylint: disable=protected-access
+        self.service._submit_conversion = lambda data, title: future
+        job = self.service.submit(b"x" * 1000)
+
+        self.remove_in_thread(job.job_id)
+        self.assertIsNone(self.service.get(job.job_id))
+        with self.assertRaises(ServerBusyError):
+            self.service.reserve(1000)
+
+        future.set_result(b"")
+        self.service.reserve(1000)
+
+
+class TestConversionServer(unittest.TestCase):
+    def setUp(self):
+        self.service = ConversionService(get_profile(), workers=1, max_jobs=1)
+        self.server = create_server(self.service, port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.service.shutdown()
+
+    def request(self, method, path, body=None):
+        connection = HTTPConnection(*self.server.server_address)
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        data = response.read()
+        connection.close()
+        return response, data
+
+    def test_convert(self):
+        response, data = self.request("POST", "/jobs?title=Test", make_cbz())
+        self.assertEqual(response.status, 202)
+        job_id = json.loads(data)["id"]
+
+        for _ in range(100):
+            response, data = self.request("GET", f"/jobs/{job_id}")
+            if json.loads(data)["status"] != "pending":
+                break
+            time.sleep(0.1)
+        self.assertEqual(json.loads(data)["status"], "done")
+
+        response, data = self.request("GET", f"/jobs/{job_id}/epub")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(
+            response.getheader("Content-Type"), "application/epub+zip"
+        )
+        with zipfile.ZipFile(io.BytesIO(data)) as epub_file:
+            self.assertIn("OEBPS/Images/001.jpg", epub_file.namelist())
+
+        response, _ = self.request("DELETE", f"/jobs/{job_id}")
+        self.assertEqual(response.status, 204)
+        response, _ = self.request("GET", f"/jobs/{job_id}")
+        self.assertEqual(response.status, 404)
+
+    def test_overloaded(self):
+        self.service.max_jobs = 0
+        response, _ = self.request("POST", "/jobs", make_cbz())
+        self.assertEqual(response.status, 429)
+        self.assertIsNotNone(response.getheader("Retry-After"))
+
+    def test_negative_content_length(self):
+        connection = HTTPConnection(*self.server.server_address)
+        connection.putrequest("POST", "/jobs")
+        connection.putheader("Content-Length", "-1")
+        connection.endheaders()
+        response = connection.getresponse()
+        connection.close()
+        self.assertEqual(response.status, 400)
+
+    def test_unknown_job(self):
+        response, _ = self.request("GET", "/jobs/unknown/epub")
+        self.assertEqual(response.status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
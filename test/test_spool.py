@@ -0,0 +1,113 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import zipfile
+from PIL import Image
+from einkify.__main__ import run_worker
+from einkify.profile_processor import DEFAULT_PROFILE
+from einkify.spool import (
+    DONE_DIRECTORY,
+    FAILED_DIRECTORY,
+    LEASE_DIRECTORY,
+    Spool,
+)
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.spool_directory = os.path.join(self.temp_dir, "spool")
+        self.input_file = os.path.join(self.temp_dir, "book.cbz")
+        with zipfile.ZipFile(self.input_file, "w") as archive:
+            for index in range(2):
+                stream = io.BytesIO()
+                Image.new("RGB", (40, 60), color=(index, 0, 0)).save(
+                    stream, "PNG"
+                )
+                archive.writestr(f"{index}.png", stream.getvalue())
+        self.output_file = os.path.join(self.temp_dir, "book.kepub.epub")
+        self.profile = DEFAULT_PROFILE.copy()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def enqueue(self, spool):
+        return spool.enqueue(self.input_file, self.output_file, self.profile)
+
+    def expire(self, spool, job_id):
+        lease_path = spool.get_path(LEASE_DIRECTORY, job_id)
+        old_time = spool.get_time() - spool.lease_ttl - 10
+        os.utime(lease_path, (old_time, old_time))
+
+    def test_enqueue_once(self):
+        spool = Spool(self.spool_directory)
+        job_id = self.enqueue(spool)
+        self.assertIsNotNone(job_id)
+        self.assertIsNone(self.enqueue(spool))
+        self.assertEqual(spool.get_job_ids(), [job_id])
+
+    def test_claimed_job_not_shared(self):
+        first = Spool(self.spool_directory, "first")
+        second = Spool(self.spool_directory, "second")
+        job_id = self.enqueue(first)
+
+        job, lease = first.claim()
+        self.assertEqual(job["id"], job_id)
+        self.assertIsNone(second.claim())
+
+        lease.release()
+        self.assertIsNotNone(second.claim())
+
+    def test_expired_lease_reclaimed(self):
+        first = Spool(self.spool_directory, "first")
+        second = Spool(self.spool_directory, "second")
+        job_id = self.enqueue(first)
+
+        job, first_lease = first.claim()
+        self.expire(first, job_id)
+        _, second_lease = second.claim()
+
+        self.assertFalse(first_lease.renew())
+        self.assertFalse(first.finish(job, first_lease, DONE_DIRECTORY))
+        self.assertTrue(second.finish(job, second_lease, DONE_DIRECTORY))
+        self.assertEqual(second.get_job_ids(), [])
+        self.assertEqual(second.get_job_ids(DONE_DIRECTORY), [job_id])
+
+    def test_heartbeat_keeps_lease(self):
+        first = Spool(self.spool_directory, "first", lease_ttl=1)
+        second = Spool(self.spool_directory, "second", lease_ttl=1)
+        self.enqueue(first)
+
+        _, lease = first.claim()
+        with lease:
+            time.sleep(1.5)
+            self.assertIsNone(second.claim())
+        self.assertIsNotNone(second.claim())
+
+    def test_failed_job_requeued(self):
+        spool = Spool(self.spool_directory)
+        job_id = self.enqueue(spool)
+        job, lease = spool.claim()
+        spool.finish(job, lease, FAILED_DIRECTORY, error="broken")
+
+        self.assertEqual(spool.get_job_ids(FAILED_DIRECTORY), [job_id])
+        self.assertEqual(self.enqueue(spool), job_id)
+        self.assertEqual(spool.get_job_ids(FAILED_DIRECTORY), [])
+
+    def test_run_worker(self):
+        spool = Spool(self.spool_directory)
+        job_id = self.enqueue(spool)
+        run_worker(spool, self.profile, exit_when_empty=True)
+
+        self.assertTrue(os.path.exists(self.output_file))
+        self.assertEqual(spool.get_job_ids(DONE_DIRECTORY), [job_id])
+        self.assertEqual(
+            os.listdir(os.path.join(self.spool_directory, LEASE_DIRECTORY)), []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
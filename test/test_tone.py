@@ -0,0 +1,78 @@
+import unittest
+from PIL import Image
+from einkify.image_processor import (
+    IDENTITY_LUT,
+    apply_tone,
+    build_tone_lut,
+    convert_image,
+    get_autocontrast_levels,
+)
+
+
+class TestBuildToneLut(unittest.TestCase):
+    def test_identity(self):
+        self.assertEqual(build_tone_lut(), IDENTITY_LUT)
+
+    def test_levels(self):
+        lut = build_tone_lut(1.0, 50, 200)
+        self.assertEqual(lut[0], 0)
+        self.assertEqual(lut[50], 0)
+        self.assertEqual(lut[125], 128)
+        self.assertEqual(lut[200], 255)
+        self.assertEqual(lut[255], 255)
+
+    def test_gamma(self):
+        self.assertLess(build_tone_lut(0.5)[128], 128)
+        self.assertGreater(build_tone_lut(2.0)[128], 128)
+
+    def test_invalid_points(self):
+        with self.assertRaises(ValueError):
+            build_tone_lut(1.0, 200, 100)
+        with self.assertRaises(ValueError):
+            build_tone_lut(0)
+
+
+class TestAutocontrastLevels(unittest.TestCase):
+    def test_levels(self):
+        histogram = [0] * 256
+        histogram[30] = 10
+        histogram[100] = 490
+        histogram[150] = 490
+        histogram[220] = 10
+        self.assertEqual(get_autocontrast_levels(histogram), (30, 220))
+        self.assertEqual(get_autocontrast_levels(histogram, 2), (100, 150))
+
+    def test_single_level(self):
+        histogram = [0] * 256
+        histogram[128] = 100
+        self.assertEqual(get_autocontrast_levels(histogram), (0, 255))
+
+
+class TestApplyTone(unittest.TestCase):
+    def test_no_adjustment_returns_image(self):
+        image = Image.new("RGB", (10, 10), color=(10, 20, 30))
+        self.assertIs(apply_tone(image, {"gamma": 1.0}), image)
+
+    def test_autocontrast_stretches(self):
+        image = Image.linear_gradient("L").point(lambda level: 64 + level // 2)
+        toned = apply_tone(image, {"autocontrast": True})
+        self.assertEqual(toned.getextrema(), (0, 255))
+
+    def test_alpha_untouched(self):
+        image = Image.new("RGBA", (10, 10), color=(100, 100, 100, 50))
+        toned = apply_tone(image, {"black_point": 100})
+        self.assertEqual(toned.getpixel((0, 0)), (0, 0, 0, 50))
+
+    def test_convert_image_mono_and_tone(self):
+        image = Image.new("RGB", (400, 400), color=(200, 200, 200))
+        converted = convert_image(
+            image,
+            {"mono": True, "white_point": 200, "max_dimension": 100},
+        )
+        self.assertEqual(converted.mode, "L")
+        self.assertEqual(converted.size, (200, 200))
+        self.assertEqual(converted.getpixel((0, 0)), 255)
+
+
+if __name__ == "__main__":
+    unittest.main()